@@ -0,0 +1,175 @@
+# array_backend.py - Flat array value grids for value iteration
+#
+# A no-dependency alternative to the list-of-lists maps in mdpAgents.py.
+# Values and rewards live in flat array('d') buffers indexed by offsets that
+# are precomputed once per layout, and the two value buffers are swapped
+# between sweeps instead of allocating a new map every time. The Bellman
+# update performs exactly the same floating point operations as
+# mdpAgents.bellmann, so both backends produce identical value maps.
+
+from array import array
+
+# Value a wall or the edge of the board contributes to its neighbours
+WALL_VALUE = -1.0
+
+
+def sweep_cells(layout, src, dst, rewards, gamma, positions):
+    """Bellman update of the cells at positions from src into dst
+
+    layout supplies the cell and neighbour offsets (an ArrayBackend). The
+    arithmetic matches mdpAgents.bellmann operation for operation.
+    """
+    cells = layout.cells
+    east = layout.east
+    west = layout.west
+    north = layout.north
+    south = layout.south
+    gamma = float(gamma)
+
+    for k in positions:
+        e = src[east[k]]
+        wv = src[west[k]]
+        n = src[north[k]]
+        s = src[south[k]]
+        best = max(n * 0.8 + (e + wv) * 0.1,
+                   s * 0.8 + (e + wv) * 0.1,
+                   e * 0.8 + (n + s) * 0.1,
+                   wv * 0.8 + (n + s) * 0.1)
+        dst[cells[k]] = rewards[k] + gamma * best
+
+
+class ValueRow(object):
+    """One row of a ValueMap, read-only"""
+
+    def __init__(self, backend, i, buffer=None):
+        self.backend = backend
+        self.i = i
+        self.buffer = buffer
+
+    def __getitem__(self, j):
+        return self.backend.value(self.i, j, self.buffer)
+
+    def __len__(self):
+        return self.backend.h
+
+
+class ValueMap(object):
+    """Read-only m[i][j] view of the current (or a given) buffer, walls read as None"""
+
+    def __init__(self, backend, buffer=None):
+        self.backend = backend
+        self.buffer = buffer
+
+    def __getitem__(self, i):
+        if i < 0 or i >= self.backend.w:
+            raise IndexError(i)
+        return ValueRow(self.backend, i, self.buffer)
+
+    def __len__(self):
+        return self.backend.w
+
+    def to_list(self):
+        return self.backend.to_list()
+
+
+class ArrayBackend(object):
+    """Double-buffered flat value grids for one layout.
+
+    Cell (i, j) of a map lives at offset i * h + j. One extra slot at the end
+    of each buffer holds WALL_VALUE, and neighbour offsets that point at a
+    wall or off the board point at that slot instead.
+    """
+
+    def __init__(self, walls, h, w):
+        self.h = h
+        self.w = w
+        self.size = h * w
+        sentinel = self.size
+        walls = set(walls)
+        self.walls = set((i, j) for i in range(w) for j in range(h)
+                         if (j, i) in walls)
+
+        def offset(i, j):
+            if 0 <= i < w and 0 <= j < h and (i, j) not in self.walls:
+                return i * h + j
+            return sentinel
+
+        self.cells = array('l')
+        self.east = array('l')
+        self.west = array('l')
+        self.north = array('l')
+        self.south = array('l')
+        self.position = {}
+        for i in range(w):
+            for j in range(h):
+                if (i, j) in self.walls:
+                    continue
+                self.position[(i, j)] = len(self.cells)
+                self.cells.append(i * h + j)
+                self.east.append(offset(i + 1, j))
+                self.west.append(offset(i - 1, j))
+                self.north.append(offset(i, j + 1))
+                self.south.append(offset(i, j - 1))
+        self.all_positions = list(range(len(self.cells)))
+
+        self.current = array('d', [0.0] * (self.size + 1))
+        self.spare = array('d', [0.0] * (self.size + 1))
+        self.current[sentinel] = WALL_VALUE
+        self.spare[sentinel] = WALL_VALUE
+        self.rewards = array('d', [0.0] * len(self.cells))
+        self.view = ValueMap(self)
+
+    def load(self, m):
+        """Copy a list-of-lists value map into the current buffer"""
+        current = self.current
+        for (i, j), k in self.position.items():
+            current[self.cells[k]] = m[i][j]
+
+    def set_rewards(self, r_map):
+        """Copy the open cells of a reward map into the reward buffer"""
+        rewards = self.rewards
+        for (i, j), k in self.position.items():
+            rewards[k] = r_map[i][j]
+
+    def positions(self, cells):
+        """Buffer positions of a list of (i, j) cells, skipping walls"""
+        return [self.position[c] for c in cells if c in self.position]
+
+    def begin_partial(self):
+        """Make both buffers agree before sweeping only part of the map"""
+        self.spare[:] = self.current
+
+    def sweep(self, gamma, positions=None):
+        """One Bellman sweep from the current buffer into the spare one"""
+        if positions is None:
+            positions = self.all_positions
+        sweep_cells(self, self.current, self.spare, self.rewards, gamma, positions)
+        self.current, self.spare = self.spare, self.current
+
+    def max_change(self, positions=None):
+        """Largest absolute change made by the last sweep"""
+        current = self.current
+        previous = self.spare
+        cells = self.cells
+        if positions is None:
+            positions = self.all_positions
+        change = 0.0
+        for k in positions:
+            c = cells[k]
+            change = max(change, abs(current[c] - previous[c]))
+        return change
+
+    def value(self, i, j, buffer=None):
+        if (i, j) in self.walls:
+            return None
+        if buffer is None:
+            buffer = self.current
+        return buffer[i * self.h + j]
+
+    def to_list(self):
+        """The current buffer as a list-of-lists map"""
+        m = [[None] * self.h for i in range(self.w)]
+        current = self.current
+        for (i, j), k in self.position.items():
+            m[i][j] = current[self.cells[k]]
+        return m
@@ -3,25 +3,55 @@
 
 import os
 import sys
+import math
 import time
 import json
+import tempfile
+import threading
 import subprocess
 from datetime import datetime
 
 class MDPBenchmark:
     """Comprehensive benchmarking suite for MDP Pacman agent"""
     
-    def __init__(self, pacman_directory="."):
+    def __init__(self, pacman_directory=".", results_store=None):
         self.pacman_dir = pacman_directory
         self.results = {}
+        # Optional results_store.ResultsStore that records every run and game
+        self.results_store = results_store
+        # Profiling output (see run_single_test profile=True)
+        self.profile_dir = 'profiles'
+        self.profile_top_n = 15
+        self._profile_files = {}
         self.test_configurations = {
             'layouts': ['smallGrid', 'mediumClassic', 'openClassic', 'trappedClassic'],
             'game_counts': [10, 25, 50],
             'time_limits': {'smallGrid': 300, 'mediumClassic': 1500, 'others': 2000}
         }
     
-    def run_single_test(self, layout, num_games, agent_class="MDPAgent", quiet=True):
-        """Run a single benchmark test and return results"""
+    def run_single_test(self, layout, num_games, agent_class="MDPAgent", quiet=True,
+                        on_game=None, agent_args=None, parameters=None, profile=False,
+                        fixed_seed=False, keep_decision_times=False):
+        """Run a single benchmark test and return results
+
+        Output is read line by line while the games run. If on_game is given
+        it is called with each game's record ({'index', 'win', 'score'}) as
+        soon as that game finishes. agent_args is a dict passed to the agent
+        with -a, e.g. {'GAMMA': 0.95} to override a parameter for this run.
+        
+        With a results store the run and each of its games are recorded as
+        they finish; runs with parameters are recorded as tuning runs.
+        
+        profile=True captures cProfile data for the agent's getAction,
+        merges it with earlier profiled runs of the same layout into
+        <profile_dir>/<layout>.pstats and .collapsed (flame graph stacks) and
+        adds the top profile_top_n functions to the result.
+        
+        fixed_seed=True passes -f so pacman.py uses its fixed random seed, and
+        keep_decision_times=True keeps every move's decision time in each
+        game record ('decision_times'). The seed mode ('fixed' or 'random')
+        is kept in the result and the results store.
+        """
         print("Running %d games on %s layout..." % (num_games, layout))
         
         # Construct command
@@ -34,46 +64,108 @@ class MDPBenchmark:
         
         if quiet:
             cmd.append('-q')
+        if fixed_seed:
+            cmd.append('-f')
         
+        raw_profile = None
+        if profile:
+            if not os.path.isdir(self.profile_dir):
+                os.makedirs(self.profile_dir)
+            raw_profile = os.path.abspath(os.path.join(self.profile_dir, '%s_%s_%d.raw' % (
+                layout, datetime.now().strftime("%Y%m%d_%H%M%S"),
+                len(self._profile_files.get(layout, [])))))
+            agent_args = dict(agent_args or {}, profile=raw_profile)
+        
+        if agent_args:
+            cmd.extend(['-a', ','.join('%s=%s' % (k, agent_args[k]) for k in sorted(agent_args))])
+        
+        seed = 'fixed' if fixed_seed else 'random'
+        run_id = None
         start_time = time.time()
         
         try:
-            # Run the test
+            if self.results_store is not None:
+                run_id = self.results_store.start_run(
+                    'tuning' if parameters is not None else 'benchmark', layout, num_games,
+                    agent_class, parameters if parameters is not None else agent_args, seed)
+            
+            # Run the test, streaming stdout and spooling stderr to a file
+            errors = tempfile.TemporaryFile()
             result = subprocess.Popen(
                 cmd, 
                 cwd=self.pacman_dir,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stderr=errors,
+                universal_newlines=True
             )
             
-            stdout, stderr = result.communicate()
+            output_lines = []
+            games = []
+            decision_times = []
+            for line in iter(result.stdout.readline, ''):
+                line = line.rstrip('\n')
+                output_lines.append(line)
+                if line.startswith('Memory usage:'):
+                    # Printed by the agent's final(), after the game's end line
+                    if games:
+                        games[-1]['memory'] = parse_memory_line(line)
+                    continue
+                if line.startswith('Decision time:'):
+                    try:
+                        decision_times.append(float(line.split()[2]))
+                    except (IndexError, ValueError):
+                        pass
+                    continue
+                game = parse_game_line(line)
+                if game is not None:
+                    game['index'] = len(games)
+                    game['moves'] = len(decision_times)
+                    if decision_times:
+                        game['decision_mean'] = sum(decision_times) / len(decision_times)
+                        game['decision_max'] = max(decision_times)
+                    if keep_decision_times:
+                        game['decision_times'] = decision_times
+                    decision_times = []
+                    games.append(game)
+                    if run_id is not None:
+                        self.results_store.add_game(run_id, game)
+                    if on_game is not None:
+                        on_game(game)
+            result.stdout.close()
+            result.wait()
+            errors.close()
             end_time = time.time()
             
             # Parse results from output
-            output_lines = stdout.split('\n')
             wins = 0
             total_score = 0
             scores = []
             
-            # Look for win/loss indicators and scores
-            for line in output_lines:
-                if 'Pacman emerges victorious' in line or 'WIN' in line:
-                    wins += 1
-                elif 'Game' in line and 'finished' in line:
-                    # Count completed games for win rate calculation
-                    pass
-                elif 'Score:' in line:
-                    try:
-                        score = int(line.split('Score:')[1].strip())
-                        scores.append(score)
-                        total_score += score
-                    except:
+            if games:
+                # One end-of-game line per game, in order
+                wins = sum(1 for g in games if g['win'])
+                scores = [g['score'] for g in games]
+                total_score = sum(scores)
+            else:
+                # Look for win/loss indicators and scores
+                for line in output_lines:
+                    if 'Pacman emerges victorious' in line or 'WIN' in line:
+                        wins += 1
+                    elif 'Game' in line and 'finished' in line:
+                        # Count completed games for win rate calculation
                         pass
-            
-            # Alternative win detection - look for positive final scores as wins
-            if wins == 0 and scores:
-                # If no explicit win messages, infer wins from positive scores
-                wins = sum(1 for score in scores if score > 0)
+                    elif 'Score:' in line:
+                        try:
+                            score = int(line.split('Score:')[1].strip())
+                            scores.append(score)
+                            total_score += score
+                        except:
+                            pass
+                
+                # Alternative win detection - look for positive final scores as wins
+                if wins == 0 and scores:
+                    # If no explicit win messages, infer wins from positive scores
+                    wins = sum(1 for score in scores if score > 0)
             
             # Calculate metrics
             win_rate = (float(wins) / float(num_games)) * 100.0 if num_games > 0 else 0.0
@@ -88,6 +180,8 @@ class MDPBenchmark:
                 'total_score': total_score,
                 'average_score': avg_score,
                 'scores': scores,
+                'games': games,
+                'seed': seed,
                 'execution_time': execution_time,
                 'games_per_second': num_games / execution_time if execution_time > 0 else 0,
                 'timestamp': datetime.now().isoformat(),
@@ -98,20 +192,108 @@ class MDPBenchmark:
             print("  Results: %d/%d wins (%.1f%%), avg score: %.1f" % 
                   (wins, num_games, win_rate, avg_score))
             
+            memory = summarize_memory(games)
+            if memory is not None:
+                result_data['memory'] = memory
+                if memory['source'] == 'rusage':
+                    print("  Memory: %.1f KiB peak RSS, %.1f KiB max growth per game" %
+                          (memory['max_rss'] / 1024.0, memory['game_rss_growth_max'] / 1024.0))
+                else:
+                    print("  Memory: %.1f KiB max move peak, %+.1f KiB mean net per game" %
+                          (memory['move_peak_max'] / 1024.0, memory['game_net_mean'] / 1024.0))
+            elif str((agent_args or {}).get('memory', '')).lower() in ('1', 'true', 'yes', 'on'):
+                # Requested, but the agent's Python could not measure memory
+                result_data['memory'] = 'unavailable'
+                print("  Memory: unavailable (no tracemalloc or resource in the agent's Python)")
+            
+            if raw_profile is not None:
+                # The games are done; a profile that cannot be merged (e.g.
+                # written by a different Python version) must not lose them
+                try:
+                    result_data['profile'] = self._collect_profile(layout, raw_profile)
+                except Exception as e:
+                    print("  Could not merge profile %s: %s" % (raw_profile, str(e)))
+                    result_data['profile'] = None
+                    result_data['profile_error'] = str(e)
+            
+            if run_id is not None:
+                self.results_store.finish_run(run_id, result_data)
+            
             return result_data
             
         except Exception as e:
             print("  ERROR: %s" % str(e))
-            return {
+            result_data = {
                 'layout': layout,
                 'num_games': num_games,
                 'success': False,
                 'error': str(e),
                 'timestamp': datetime.now().isoformat()
             }
+            if run_id is not None:
+                self.results_store.finish_run(run_id, result_data)
+            return result_data
+    
+    def _collect_profile(self, layout, raw_profile):
+        """Merge a run's raw profile into the layout's profile summary"""
+        from profiling import summarize_profiles
+        
+        if not os.path.exists(raw_profile):
+            print("  No profile data written by the agent")
+            return None
+        # Only keep the file for later merges once it has merged cleanly
+        files = self._profile_files.get(layout, []) + [raw_profile]
+        summary = summarize_profiles(files, os.path.join(self.profile_dir, layout),
+                                     self.profile_top_n)
+        self._profile_files[layout] = files
+        print("  Profile: %s (%d runs), hottest: %s" %
+              (summary['pstats_file'], summary['runs'],
+               ', '.join(f['function'] for f in summary['top_functions'][:3])))
+        return summary
     
-    def run_comprehensive_benchmark(self, save_results=True):
-        """Run comprehensive benchmark across all configurations"""
+    def run_distributed_test(self, layout, num_games, queue_dir, shard_size=5,
+                             agent_class="MDPAgent", timeout=None, max_wait=None):
+        """Run a test as game shards on distributed workers
+
+        Shards of shard_size games are put on the job queue in queue_dir and
+        run by any workers started with 'python2 distributed.py worker'.
+        Shards whose worker goes silent for timeout seconds are retried, and
+        shards not finished after max_wait seconds (distributed.WAIT_TIMEOUT
+        by default) are given up as failed.
+        """
+        from distributed import JobQueue, merge_shards, JOB_TIMEOUT, WAIT_TIMEOUT
+        
+        timeout = timeout or JOB_TIMEOUT
+        queue = JobQueue(queue_dir)
+        job_ids = []
+        remaining = num_games
+        while remaining > 0:
+            shard = min(shard_size, remaining)
+            job_ids.append(queue.submit('benchmark', {
+                'layout': layout, 'num_games': shard, 'agent_class': agent_class}, timeout))
+            remaining -= shard
+        
+        print("Queued %d games on %s as %d shards in %s" % (num_games, layout, len(job_ids), queue_dir))
+        shard_results = queue.wait(job_ids, timeout, max_wait=max_wait or WAIT_TIMEOUT)
+        result = merge_shards(layout, num_games, shard_results)
+        if self.results_store is not None:
+            self.results_store.record_result(result, 'benchmark', agent_class=agent_class)
+        
+        if result['success']:
+            print("  Results: %d/%d wins (%.1f%%), avg score: %.1f" % 
+                  (result['wins'], num_games, result['win_rate'], result['average_score']))
+        else:
+            print("  ERROR: %s" % result['error'])
+        return result
+    
+    def run_comprehensive_benchmark(self, save_results=True, reuse_games=True):
+        """Run comprehensive benchmark across all configurations
+
+        By default each layout is played once at the largest game count and
+        the smaller counts are reported as prefixes of that run, so every
+        tier comes from the same games. reuse_games=False plays every tier
+        separately as before.
+        """
         print("="*60)
         print("COMPREHENSIVE MDP AGENT BENCHMARK")
         print("="*60)
@@ -126,21 +308,23 @@ class MDPBenchmark:
             
             layout_results = []
             
-            for num_games in self.test_configurations['game_counts']:
-                result = self.run_single_test(layout, num_games)
-                layout_results.append(result)
-                all_results.append(result)
-                
-                # Brief pause between tests
-                time.sleep(1)
+            if reuse_games:
+                layout_results = self._run_game_tiers(layout, self.test_configurations['game_counts'])
+                all_results.extend(layout_results)
+            else:
+                for num_games in self.test_configurations['game_counts']:
+                    result = self.run_single_test(layout, num_games)
+                    layout_results.append(result)
+                    all_results.append(result)
+                    
+                    # Brief pause between tests
+                    time.sleep(1)
             
             # Layout summary
-            successful_tests = [r for r in layout_results if r.get('success', False)]
-            if successful_tests:
-                avg_win_rate = sum(r['win_rate'] for r in successful_tests) / len(successful_tests)
-                avg_score = sum(r['average_score'] for r in successful_tests) / len(successful_tests)
-                print("  %s Summary: %.1f%% win rate, %.1f avg score" % 
-                      (layout, avg_win_rate, avg_score))
+            summary = layout_summaries(layout_results).get(layout)
+            if summary is not None:
+                print("  %s Summary: %.1f%% win rate, %.1f avg score over %d games" %
+                      (layout, summary['win_rate'], summary['average_score'], summary['games']))
         
         # Overall analysis
         self._analyze_benchmark_results(all_results)
@@ -151,8 +335,51 @@ class MDPBenchmark:
         
         return all_results
     
-    def run_statistical_analysis(self, layout='mediumClassic', num_trials=5, games_per_trial=25):
-        """Run multiple trials for statistical significance"""
+    def _run_game_tiers(self, layout, game_counts):
+        """Play the largest game count once and report every count as a prefix
+
+        Tiers the run never reached, e.g. because pacman.py exited early, are
+        returned as failed results recording how many games were played.
+        """
+        tiers = sorted(set(game_counts))
+        aggregator = RunningAggregator(layout, tiers)
+        result = self.run_single_test(layout, tiers[-1], on_game=aggregator.add)
+        
+        if not result.get('success', False):
+            return [dict(result, num_games=n) for n in tiers]
+        
+        tier_results = aggregator.tier_results()
+        for tier_result in tier_results:
+            print("  First %d games: %.1f%% win rate, %.1f avg score" %
+                  (tier_result['num_games'], tier_result['win_rate'], tier_result['average_score']))
+        if tier_results:
+            tier_results[-1]['convergence'] = aggregator.curve
+        for n in tiers[len(tier_results):]:
+            print("  First %d games: not reached, only %d games played" % (n, aggregator.games))
+            tier_results.append({
+                'layout': layout,
+                'num_games': n,
+                'games_played': aggregator.games,
+                'prefix_of': tiers[-1],
+                'timestamp': datetime.now().isoformat(),
+                'success': False,
+                'error': 'only %d of %d games played' % (aggregator.games, n)
+            })
+        return tier_results
+    
+    def run_statistical_analysis(self, layout='mediumClassic', num_trials=5, games_per_trial=25,
+                                 target_ci_width=None, max_games=200, threshold=None):
+        """Run multiple trials for statistical significance
+
+        With target_ci_width (in win rate percentage points) games are played
+        sequentially until the confidence interval is that narrow instead of
+        a fixed num_trials x games_per_trial; see run_sequential_analysis.
+        """
+        if target_ci_width is not None:
+            return self.run_sequential_analysis(layout, target_ci_width, max_games,
+                                                batch_size=games_per_trial,
+                                                threshold=threshold)
+
         print("="*60)
         print("STATISTICAL ANALYSIS - %s Layout" % layout)
         print("="*60)
@@ -194,6 +421,168 @@ class MDPBenchmark:
         
         return trial_results
     
+    def run_sequential_analysis(self, layout='mediumClassic', target_ci_width=10.0,
+                                max_games=200, batch_size=10, threshold=None):
+        """Play batches of games until the win rate is known precisely enough
+
+        Stops when the 95% Wilson confidence interval of the win rate is at
+        most target_ci_width percentage points wide, when it lies entirely
+        above or below threshold (a win rate in percent, if given), or when
+        max_games have been played.
+
+        The threshold is tested after every batch, so the decisive stop uses
+        a Bonferroni-adjusted interval over all the looks the run may take
+        (see sequential_z); with a fixed 95% interval an agent whose win rate
+        is exactly at the threshold would be called decisive about one run
+        in five.
+        """
+        print("="*60)
+        print("SEQUENTIAL ANALYSIS - %s Layout" % layout)
+        print("="*60)
+        print("Target CI width: %.1f%%, max games: %d, batch size: %d" %
+              (target_ci_width, max_games, batch_size))
+        decision_z = sequential_z(max_games, batch_size)
+        if threshold is not None:
+            print("Threshold %.1f%% tested at z=%.2f over up to %d looks" %
+                  (threshold, decision_z, sequential_looks(max_games, batch_size)))
+
+        batch_results = []
+        games = 0
+        wins = 0
+        scores = []
+        lower, upper = 0.0, 100.0
+        stopped = 'max_games'
+
+        while games < max_games:
+            batch = min(batch_size, max_games - games)
+            result = self.run_single_test(layout, batch)
+            batch_results.append(result)
+            # Only games that were actually played count; pacman.py can exit
+            # early without raising, leaving fewer (or no) end-of-game lines
+            played = result.get('games') or []
+            if not result.get('success', False) or not played:
+                stopped = 'error'
+                break
+
+            games += len(played)
+            wins += sum(1 for g in played if g['win'])
+            scores.extend(g['score'] for g in played)
+            lower, upper = wilson_interval(wins, games)
+            print("  After %d games: %.1f%% win rate, 95%% CI [%.1f%%, %.1f%%]" %
+                  (games, 100.0 * wins / games, lower, upper))
+
+            if upper - lower <= target_ci_width:
+                stopped = 'ci_width'
+                break
+            if threshold is not None:
+                decision_lower, decision_upper = wilson_interval(wins, games, decision_z)
+                if decision_lower > threshold or decision_upper < threshold:
+                    stopped = 'decisive'
+                    break
+
+        win_rate = 100.0 * wins / games if games > 0 else 0.0
+        summary = {
+            'layout': layout,
+            'games_used': games,
+            'max_games': max_games,
+            'wins': wins,
+            'win_rate': win_rate,
+            'average_score': float(sum(scores)) / len(scores) if scores else 0.0,
+            'ci_lower': lower,
+            'ci_upper': upper,
+            'ci_width': upper - lower,
+            'threshold': threshold,
+            'decision_z': decision_z,
+            'stopped_reason': stopped,
+            'batches': batch_results,
+            'timestamp': datetime.now().isoformat()
+        }
+
+        print("\n--- Sequential Summary ---")
+        print("  Games used: %d of %d (stopped: %s)" % (games, max_games, stopped))
+        print("  Win rate: %.2f%% (95%% CI [%.2f%%, %.2f%%])" % (win_rate, lower, upper))
+
+        return summary
+
+    def run_load_test(self, layout='mediumClassic', concurrency_levels=(1, 2, 4, 8),
+                      games_per_process=2, agent_class="MDPAgent", agent_args=None,
+                      fixed_seed=True):
+        """Decision latency with several games running at once on this host
+
+        For each concurrency level that many pacman.py processes are started
+        together, each playing games_per_process games. Every move's decision
+        time is collected, and each level reports the p50/p95/p99/max
+        latency and the decisions made per second across all processes.
+        With fixed_seed every process plays pacman.py's fixed-seed games, so
+        runs on different hosts or commits see the same game situations.
+        """
+        print("="*60)
+        print("LOAD TEST - %s Layout" % layout)
+        print("="*60)
+        print("Concurrency levels: %s, %d games per process, %d CPUs" %
+              (list(concurrency_levels), games_per_process, cpu_count()))
+
+        levels = []
+        for concurrency in concurrency_levels:
+            results = [None] * concurrency
+
+            def play(slot):
+                results[slot] = self.run_single_test(
+                    layout, games_per_process, agent_class, quiet=True,
+                    agent_args=agent_args, fixed_seed=fixed_seed,
+                    keep_decision_times=True)
+
+            start_time = time.time()
+            threads = [threading.Thread(target=play, args=(slot,))
+                       for slot in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_time = time.time() - start_time
+
+            times = []
+            games = []
+            failures = 0
+            for result in results:
+                if not result or not result.get('success', False):
+                    failures += 1
+                    continue
+                for game in result['games']:
+                    games.append(game)
+                    times.extend(game.get('decision_times', []))
+
+            level = latency_percentiles(times)
+            level.update({
+                'concurrency': concurrency,
+                'games': len(games),
+                'wins': sum(1 for g in games if g['win']),
+                'failed_processes': failures,
+                'wall_time': wall_time,
+                'decisions_per_second': len(times) / wall_time if wall_time > 0 else 0.0
+            })
+            levels.append(level)
+
+        print("\n--- Decision Latency (ms) ---")
+        print("  %11s %9s %8s %8s %8s %8s %12s" %
+              ("concurrency", "decisions", "p50", "p95", "p99", "max", "decisions/s"))
+        for level in levels:
+            print("  %11d %9d %8.1f %8.1f %8.1f %8.1f %12.1f" %
+                  (level['concurrency'], level['count'], 1000 * level['p50'],
+                   1000 * level['p95'], 1000 * level['p99'], 1000 * level['max'],
+                   level['decisions_per_second']))
+
+        return {
+            'layout': layout,
+            'agent_class': agent_class,
+            'agent_args': agent_args,
+            'games_per_process': games_per_process,
+            'fixed_seed': fixed_seed,
+            'cpu_count': cpu_count(),
+            'levels': levels,
+            'timestamp': datetime.now().isoformat()
+        }
+
     def _analyze_benchmark_results(self, results):
         """Analyze and summarize benchmark results"""
         print("\n" + "="*60)
@@ -206,33 +595,25 @@ class MDPBenchmark:
             print("No successful test results to analyze.")
             return
         
-        # Group by layout
-        layout_performance = {}
-        for result in successful_results:
-            layout = result['layout']
-            if layout not in layout_performance:
-                layout_performance[layout] = []
-            layout_performance[layout].append(result)
-        
-        # Performance summary by layout
+        # Performance summary by layout, counting every game once
+        layout_performance = layout_summaries(successful_results)
+        if not layout_performance:
+            print("No games were played in the successful tests.")
+            return
         print("Performance by Layout:")
-        for layout, layout_results in layout_performance.items():
-            win_rates = [r['win_rate'] for r in layout_results]
-            avg_win_rate = sum(win_rates) / len(win_rates)
-            
-            scores = [r['average_score'] for r in layout_results]
-            avg_score = sum(scores) / len(scores)
-            
-            print("  %s: %.1f%% win rate, %.1f avg score (%d tests)" % 
-                  (layout, avg_win_rate, avg_score, len(layout_results)))
+        for layout, summary in layout_performance.items():
+            print("  %s: %.1f%% win rate, %.1f avg score (%d games, %d tests)" % 
+                  (layout, summary['win_rate'], summary['average_score'],
+                   summary['games'], summary['tests']))
         
-        # Overall performance
-        overall_win_rate = sum(r['win_rate'] for r in successful_results) / len(successful_results)
-        overall_avg_score = sum(r['average_score'] for r in successful_results) / len(successful_results)
+        # Overall performance, each layout weighted equally
+        summaries = list(layout_performance.values())
+        overall_win_rate = sum(s['win_rate'] for s in summaries) / len(summaries)
+        overall_avg_score = sum(s['average_score'] for s in summaries) / len(summaries)
         
         print("\nOverall Performance:")
-        print("  Average win rate across all tests: %.1f%%" % overall_win_rate)
-        print("  Average score across all tests: %.1f" % overall_avg_score)
+        print("  Average win rate across layouts: %.1f%%" % overall_win_rate)
+        print("  Average score across layouts: %.1f" % overall_avg_score)
         
         # Performance recommendations
         print("\nPerformance Assessment:")
@@ -252,6 +633,204 @@ class MDPBenchmark:
         print("\nBenchmark results saved to: %s" % filename)
 
 
+class RunningAggregator:
+    """Accumulates per-game results of one run as they stream in
+
+    Snapshots of the statistics are kept when the game count reaches each
+    tier, together with a convergence curve of win rate and average score
+    after every game.
+    """
+    
+    def __init__(self, layout, tiers):
+        self.layout = layout
+        self.tiers = sorted(tiers)
+        self.start_time = time.time()
+        self.games = 0
+        self.wins = 0
+        self.scores = []
+        self.curve = []
+        self.snapshots = []
+    
+    def add(self, game):
+        """Add one game record ({'win', 'score'})"""
+        self.games += 1
+        if game['win']:
+            self.wins += 1
+        self.scores.append(game['score'])
+        win_rate = 100.0 * self.wins / self.games
+        avg_score = float(sum(self.scores)) / self.games
+        self.curve.append({'games': self.games, 'win_rate': win_rate, 'average_score': avg_score})
+        
+        if self.games in self.tiers:
+            execution_time = time.time() - self.start_time
+            self.snapshots.append({
+                'layout': self.layout,
+                'num_games': self.games,
+                'wins': self.wins,
+                'win_rate': win_rate,
+                'total_score': sum(self.scores),
+                'average_score': avg_score,
+                'scores': list(self.scores),
+                'execution_time': execution_time,
+                'games_per_second': self.games / execution_time if execution_time > 0 else 0,
+                'prefix_of': self.tiers[-1],
+                'timestamp': datetime.now().isoformat(),
+                'success': True,
+                'error': None
+            })
+    
+    def tier_results(self):
+        """Snapshot for every tier reached, smallest first"""
+        return list(self.snapshots)
+
+
+def parse_game_line(line):
+    """Game record from a pacman.py end-of-game line, or None"""
+    if 'Pacman emerges victorious' in line:
+        won = True
+    elif 'Pacman died' in line:
+        won = False
+    else:
+        return None
+    try:
+        score = int(line.split('Score:')[1].strip())
+    except (IndexError, ValueError):
+        return None
+    return {'win': won, 'score': score}
+
+def parse_memory_line(line):
+    """Dict of byte counts from the agent's 'Memory usage:' line"""
+    memory = {}
+    for token in line.split(':', 1)[1].split():
+        key, _, value = token.partition('=')
+        try:
+            memory[key] = int(value)
+        except ValueError:
+            pass
+    return memory
+
+def summarize_memory(games):
+    """Memory stats over a run's games, or None if memory was not tracked
+
+    'source' is 'tracemalloc' for per-move allocation stats, or 'rusage'
+    when the agent ran on Python 2 and only reported its peak resident set
+    size after each game.
+    """
+    records = [g['memory'] for g in games if g.get('memory')]
+    if not records:
+        return None
+    if 'max_rss' in records[0]:
+        growth = [m.get('game_rss_growth', 0) for m in records]
+        return {
+            'source': 'rusage',
+            'games': len(records),
+            'max_rss': max(m.get('max_rss', 0) for m in records),
+            'game_rss_growth_max': max(growth),
+            # Peak RSS growth per game; later games only grow it past the
+            # earlier peak, so steady growth points at a leak
+            'game_rss_growth': growth
+        }
+    return {
+        'source': 'tracemalloc',
+        'games': len(records),
+        'move_peak_max': max(m.get('move_peak_max', 0) for m in records),
+        'move_peak_mean': sum(m.get('move_peak_mean', 0) for m in records) // len(records),
+        'game_peak_max': max(m.get('game_peak', 0) for m in records),
+        'game_net_mean': sum(m.get('game_net', 0) for m in records) // len(records),
+        # Net bytes still held after each game; steady growth points at a leak
+        'game_net': [m.get('game_net', 0) for m in records]
+    }
+
+def latency_percentiles(times):
+    """Count, mean and nearest-rank p50/p95/p99/max of a list of durations"""
+    times = sorted(times)
+    summary = {'count': len(times)}
+    if not times:
+        for key in ['mean', 'p50', 'p95', 'p99', 'max']:
+            summary[key] = 0.0
+        return summary
+    summary['mean'] = sum(times) / len(times)
+    for p in [50, 95, 99]:
+        rank = max(1, int(math.ceil(p / 100.0 * len(times))))
+        summary['p%d' % p] = times[rank - 1]
+    summary['max'] = times[-1]
+    return summary
+
+def cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+def wilson_interval(wins, games, z=1.96):
+    """Wilson score interval for a win rate, as percentages"""
+    if games == 0:
+        return 0.0, 100.0
+    p = float(wins) / games
+    denominator = 1.0 + z * z / games
+    centre = (p + z * z / (2.0 * games)) / denominator
+    margin = z * ((p * (1.0 - p) / games + z * z / (4.0 * games * games)) ** 0.5) / denominator
+    return 100.0 * max(0.0, centre - margin), 100.0 * min(1.0, centre + margin)
+
+def layout_summaries(results):
+    """Win rate and average score per layout, counting every game once
+
+    Prefix tiers of one run (see _run_game_tiers) share their games, so only
+    the largest successful tier of each run is used; separate runs are
+    pooled game by game.
+    """
+    largest_prefix = {}
+    independent = {}
+    for result in results:
+        if not result.get('success', False):
+            continue
+        layout = result['layout']
+        if 'prefix_of' in result:
+            best = largest_prefix.get(layout)
+            if best is None or result['num_games'] > best['num_games']:
+                largest_prefix[layout] = result
+        else:
+            independent.setdefault(layout, []).append(result)
+    for layout, result in largest_prefix.items():
+        independent.setdefault(layout, []).append(result)
+
+    summaries = {}
+    for layout, layout_results in independent.items():
+        games = sum(r['num_games'] for r in layout_results)
+        if games == 0:
+            continue
+        summaries[layout] = {
+            'games': games,
+            'tests': len(layout_results),
+            'win_rate': 100.0 * sum(r['wins'] for r in layout_results) / games,
+            'average_score': float(sum(r['total_score'] for r in layout_results)) / games
+        }
+    return summaries
+
+def normal_quantile(p):
+    """Inverse of the standard normal distribution function, by bisection"""
+    low, high = -10.0, 10.0
+    for step in range(100):
+        middle = (low + high) / 2.0
+        if 0.5 * (1.0 + math.erf(middle / math.sqrt(2.0))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.0
+
+def sequential_looks(max_games, batch_size):
+    """Number of times run_sequential_analysis may test its threshold"""
+    return max(1, int(math.ceil(float(max_games) / batch_size)))
+
+def sequential_z(max_games, batch_size, alpha=0.05):
+    """Two-sided z that keeps the overall false-stop rate at most alpha
+
+    Bonferroni over every look: each one is tested at alpha / looks.
+    """
+    looks = sequential_looks(max_games, batch_size)
+    return normal_quantile(1.0 - alpha / (2.0 * looks))
+
 def quick_benchmark(layout='mediumClassic', num_games=25):
     """Quick benchmark function for immediate testing"""
     benchmark = MDPBenchmark()
@@ -289,6 +868,8 @@ if __name__ == "__main__":
     print("  - compare_agents(agent1, agent2, layout, num_games)")
     print("  - MDPBenchmark().run_comprehensive_benchmark()")
     print("  - MDPBenchmark().run_statistical_analysis()")
+    print("  - MDPBenchmark().run_sequential_analysis(layout, target_ci_width)")
+    print("  - MDPBenchmark().run_load_test(layout, concurrency_levels)")
     print()
     print("Example usage:")
     print("  python2 benchmark.py")
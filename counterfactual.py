@@ -0,0 +1,150 @@
+# counterfactual.py - Screen parameter sets on recorded game states
+#
+# Playing whole games is the only way the tuner judges a parameter set, yet
+# most of a candidate's decisions usually match the incumbent's. This
+# replays a corpus of recorded turns (written by the agent with
+# -a record=states.jsonl) through the planner once per candidate and
+# reports, per candidate, the turns where its move differs from the
+# baseline's and the moves that walk into ghost contact although a safer
+# move existed. Each state is parsed, and its legal moves and ghost contact
+# cells found, once for all candidates.
+#
+# Candidates override the tunable module parameters of mdpAgents while
+# they are planned, the same way -a GAMMA=0.95 does in a game.
+#
+# Every turn is planned cold, with ITERATIONS sweeps from initial_map,
+# whereas in a game the agent starts each move from the previous move's
+# map. The moves and contact counts therefore describe a cold-start
+# planner, not exactly the one that played; they are a cheap screen, not a
+# replay of the games.
+#
+# Usage:
+#   >>> evaluate_configurations(load_states('states.jsonl'), [{'DANGER': 600}, {'GAMMA': 0.95}])
+#   >>> ParameterTuner().prescreen_configurations(candidates, 'states.jsonl')
+
+from mdpAgents import apply_parameters, choose_action, parameter_values
+from planner_comparison import MOVES, array_planner, legal_moves, load_states, time_planner
+
+# Turns of each candidate listed in full in the report
+MAX_LISTED_TURNS = 20
+
+
+def contact_cells(snap):
+    """Cells where Pacman would meet a ghost: the ghosts and their open neighbours"""
+    walls = set(snap['walls'])
+    cells = set()
+    for (x, y) in snap['ghosts']:
+        x = int(round(x))
+        y = int(round(y))
+        cells.add((x, y))
+        for (dx, dy) in MOVES.values():
+            if (x + dx, y + dy) not in walls:
+                cells.add((x + dx, y + dy))
+    return cells
+
+
+def move_target(snap, move):
+    dx, dy = MOVES[move]
+    return (snap['pacman'][0] + dx, snap['pacman'][1] + dy)
+
+
+class StateSetup:
+    """Everything about a recorded state that does not depend on parameters"""
+
+    def __init__(self, index, snap):
+        self.index = index
+        self.snap = snap
+        self.legal = snap.get('legal') or legal_moves(snap)
+        self.legal = [move for move in self.legal if move in MOVES]
+        contact = contact_cells(snap)
+        self.unsafe = set(move for move in self.legal
+                          if move_target(snap, move) in contact)
+        # Walking into contact only counts against a move if another was safe
+        self.avoidable = len(self.unsafe) < len(self.legal)
+
+
+def plan_move(setup, parameters):
+    """Move chosen on a state with parameters applied, and the planning time
+
+    The state is planned from a fresh map, not warm-started like a game move.
+    """
+    saved = parameter_values()
+    try:
+        apply_parameters(parameters)
+        m, elapsed = time_planner(array_planner, setup.snap, 1)
+        choice = choose_action(m, setup.snap['pacman'], setup.legal)[0]
+    finally:
+        apply_parameters(saved)
+    return choice, elapsed
+
+
+def evaluate_file(path, candidates, baseline=None):
+    """evaluate_configurations on the states recorded in a JSON lines file"""
+    return evaluate_configurations(load_states(path), candidates, baseline)
+
+
+def evaluate_configurations(states, candidates, baseline=None):
+    """Plan every state with the baseline and each candidate parameter set.
+
+    states are snapshot dicts (see load_states), candidates a list of
+    parameter dicts; parameters a candidate does not set keep the baseline
+    value. The baseline defaults to the current module parameters. Returns
+    the baseline's report followed by one report per candidate.
+    """
+    if baseline is None:
+        baseline = parameter_values()
+    configurations = [baseline] + [dict(baseline, **candidate) for candidate in candidates]
+    reports = []
+    for parameters in configurations:
+        reports.append({
+            'parameters': parameters,
+            'states': 0,
+            'differs': 0,
+            'contact_moves': 0,
+            'avoidable_contacts': 0,
+            'plan_time': 0.0,
+            'differing_turns': [],
+            'contact_turns': []
+        })
+
+    for index, snap in enumerate(states):
+        setup = StateSetup(index, snap)
+        if not setup.legal:
+            continue
+        baseline_move = None
+        for report in reports:
+            move, elapsed = plan_move(setup, report['parameters'])
+            if baseline_move is None:
+                baseline_move = move
+            report['states'] += 1
+            report['plan_time'] += elapsed
+            if move != baseline_move:
+                report['differs'] += 1
+                if len(report['differing_turns']) < MAX_LISTED_TURNS:
+                    report['differing_turns'].append((index, baseline_move, move))
+            if move in setup.unsafe:
+                report['contact_moves'] += 1
+                if setup.avoidable:
+                    report['avoidable_contacts'] += 1
+                    if len(report['contact_turns']) < MAX_LISTED_TURNS:
+                        report['contact_turns'].append((index, move))
+
+    for report in reports:
+        states = report['states'] or 1
+        report['differ_rate'] = float(report['differs']) / states
+        report['identical'] = report['differs'] == 0
+    return reports
+
+
+def print_reports(reports):
+    print("Moves planned cold from each recorded state, not warm-started as in play")
+    print("%-8s %7s %8s %9s %9s  %s" % ("", "states", "differ", "contacts", "avoidable",
+                                         "parameters"))
+    baseline = reports[0]['parameters']
+    for n, report in enumerate(reports):
+        changed = dict((k, v) for k, v in report['parameters'].items()
+                       if baseline.get(k) != v)
+        print("%-8s %7d %7.1f%% %9d %9d  %s" %
+              ("baseline" if n == 0 else "#%d" % n, report['states'],
+               100.0 * report['differ_rate'], report['contact_moves'],
+               report['avoidable_contacts'], changed if n else ""))
@@ -0,0 +1,309 @@
+# distributed.py - Multi-node benchmark and tuning workers
+#
+# A coordinator splits benchmark runs into game shards (or tuning sweeps into
+# single configurations) and puts them on a job queue kept in a directory.
+# Stateless workers on any host that can see the directory (a shared or
+# network filesystem) claim jobs, run them with pacman.py and write the
+# results back. Claims are atomic renames, workers keep a heartbeat on the
+# jobs they run, and jobs whose worker stops heartbeating are put back on
+# the queue after a timeout.
+#
+# Usage:
+#   python2 distributed.py worker <queue_dir> [pacman_dir]
+#   >>> MDPBenchmark().run_distributed_test('mediumClassic', 50, 'queue')
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import threading
+from datetime import datetime
+from benchmark import MDPBenchmark
+
+# Seconds without a heartbeat before a running job is handed out again
+JOB_TIMEOUT = 300
+# Attempts before a job is given up and recorded as failed
+MAX_ATTEMPTS = 3
+# Seconds a coordinator waits for its jobs before giving up on the rest
+WAIT_TIMEOUT = 3600
+
+
+class JobQueue:
+    """Directory-backed job queue shared by a coordinator and its workers
+
+    Jobs are JSON files that move from pending/ to running/ when a worker
+    claims them and are replaced by a file in done/ when they finish.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.pending_dir = os.path.join(root, 'pending')
+        self.running_dir = os.path.join(root, 'running')
+        self.done_dir = os.path.join(root, 'done')
+        for path in [self.pending_dir, self.running_dir, self.done_dir]:
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    # Another process created it first
+                    pass
+
+    def _write(self, path, data):
+        """Write JSON so that readers never see a partial file"""
+        tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _job_files(self, directory):
+        return sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+
+    def submit(self, kind, payload, timeout=JOB_TIMEOUT):
+        """Queue a job and return its id
+
+        timeout is the job's heartbeat expiry in seconds. It is stored in the
+        job, so the worker running it beats often enough for that expiry.
+        """
+        job_id = '%013d_%s' % (int(time.time() * 1000), uuid.uuid4().hex[:8])
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'payload': payload,
+            'timeout': timeout,
+            'attempts': 0,
+            'submitted': datetime.now().isoformat()
+        }
+        self._write(os.path.join(self.pending_dir, job_id + '.json'), job)
+        return job_id
+
+    def claim(self, worker_id):
+        """Claim the oldest pending job, or return None if there is none"""
+        for name in self._job_files(self.pending_dir):
+            pending_path = os.path.join(self.pending_dir, name)
+            running_path = os.path.join(self.running_dir, name)
+            try:
+                # The rename keeps the file's mtime, which requeue_expired
+                # reads as the last heartbeat; refresh it first so a job
+                # queued long ago is not requeued the moment it is claimed
+                os.utime(pending_path, None)
+                os.rename(pending_path, running_path)
+            except OSError:
+                # Another worker claimed it first
+                continue
+            job = self._read(running_path)
+            if job is None:
+                continue
+            job['attempts'] += 1
+            job['worker'] = worker_id
+            job['claimed'] = datetime.now().isoformat()
+            self._write(running_path, job)
+            return job
+        return None
+
+    def heartbeat(self, job_id):
+        """Mark a running job as still alive"""
+        try:
+            os.utime(os.path.join(self.running_dir, job_id + '.json'), None)
+        except OSError:
+            pass
+
+    def complete(self, job, result):
+        """Record a job's result and drop it from the running jobs"""
+        done = dict(job, result=result, finished=datetime.now().isoformat())
+        self._write(os.path.join(self.done_dir, job['id'] + '.json'), done)
+        try:
+            os.remove(os.path.join(self.running_dir, job['id'] + '.json'))
+        except OSError:
+            pass
+
+    def requeue_expired(self, timeout=JOB_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        """Put running jobs without a recent heartbeat back on the queue
+
+        Each job expires after its own stored timeout; timeout applies to
+        jobs submitted without one.
+        """
+        requeued = []
+        now = time.time()
+        for name in self._job_files(self.running_dir):
+            path = os.path.join(self.running_dir, name)
+            try:
+                silent = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            job = self._read(path)
+            if job is None or silent < job.get('timeout', timeout):
+                continue
+            if job['attempts'] >= max_attempts:
+                self.complete(job, {'success': False,
+                                    'error': 'Gave up after %d attempts' % job['attempts']})
+                continue
+            try:
+                os.rename(path, os.path.join(self.pending_dir, name))
+                requeued.append(job['id'])
+            except OSError:
+                pass
+        return requeued
+
+    def result(self, job_id):
+        """Finished job record, or None if it is not done yet"""
+        return self._read(os.path.join(self.done_dir, job_id + '.json'))
+
+    def cancel(self, job_id):
+        """Drop a job that no worker has claimed yet, True if it was pending"""
+        try:
+            os.remove(os.path.join(self.pending_dir, job_id + '.json'))
+            return True
+        except OSError:
+            return False
+
+    def wait(self, job_ids, timeout=JOB_TIMEOUT, poll_interval=1.0, max_wait=WAIT_TIMEOUT):
+        """Wait for all jobs to finish, re-queueing lost ones along the way
+
+        After max_wait seconds (None waits forever) the jobs still pending
+        are cancelled, and every unfinished job gets a failed result, so a
+        coordinator with no live workers does not block indefinitely.
+        """
+        results = {}
+        start = time.time()
+        while len(results) < len(job_ids):
+            for job_id in job_ids:
+                if job_id not in results:
+                    done = self.result(job_id)
+                    if done is not None:
+                        results[job_id] = done['result']
+            if len(results) == len(job_ids):
+                break
+            if max_wait is not None and time.time() - start > max_wait:
+                for job_id in job_ids:
+                    if job_id not in results:
+                        self.cancel(job_id)
+                        results[job_id] = {'success': False,
+                                           'error': 'Not finished after %ds' % max_wait}
+                print("  Gave up waiting after %ds" % max_wait)
+                break
+            for job_id in self.requeue_expired(timeout):
+                print("  Job %s timed out, re-queued" % job_id)
+            time.sleep(poll_interval)
+        return [results[job_id] for job_id in job_ids]
+
+
+def execute_job(job, pacman_directory="."):
+    """Run one job and return its result"""
+    benchmark = MDPBenchmark(pacman_directory)
+    payload = job['payload']
+
+    if job['kind'] == 'benchmark':
+        return benchmark.run_single_test(payload['layout'], payload['num_games'],
+                                         payload.get('agent_class', 'MDPAgent'),
+                                         agent_args=payload.get('agent_args'))
+    elif job['kind'] == 'tuning':
+        result = benchmark.run_single_test(payload['layout'], payload['num_games'],
+                                           agent_args=payload['parameters'])
+        result['parameters'] = payload['parameters']
+        return result
+
+    return {'success': False, 'error': 'Unknown job kind: %s' % job['kind']}
+
+
+def run_worker(queue_dir, pacman_directory=".", poll_interval=1.0, max_jobs=None,
+               idle_timeout=None, timeout=JOB_TIMEOUT):
+    """Claim and run jobs until max_jobs are done or the queue stays idle
+
+    Heartbeats are sent three times per job timeout, taken from the job
+    itself; timeout is used for jobs submitted without one.
+    """
+    queue = JobQueue(queue_dir)
+    worker_id = '%s:%d' % (socket.gethostname(), os.getpid())
+    jobs_done = 0
+    idle_since = time.time()
+    print("Worker %s serving %s" % (worker_id, queue_dir))
+
+    while max_jobs is None or jobs_done < max_jobs:
+        job = queue.claim(worker_id)
+        if job is None:
+            if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        print("Worker %s running job %s (%s)" % (worker_id, job['id'], job['kind']))
+        stop = threading.Event()
+        interval = job.get('timeout', timeout) / 3.0
+
+        def beat():
+            while not stop.wait(interval):
+                queue.heartbeat(job['id'])
+
+        heart = threading.Thread(target=beat)
+        heart.daemon = True
+        heart.start()
+        try:
+            result = execute_job(job, pacman_directory)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            stop.set()
+
+        result['worker'] = worker_id
+        queue.complete(job, result)
+        jobs_done += 1
+        idle_since = time.time()
+
+    return jobs_done
+
+
+def merge_shards(layout, num_games, shard_results):
+    """Combine per-shard benchmark results into one run_single_test result"""
+    failed = [r for r in shard_results if not r.get('success', False)]
+    if failed:
+        return {
+            'layout': layout,
+            'num_games': num_games,
+            'success': False,
+            'error': '; '.join(str(r.get('error')) for r in failed),
+            'timestamp': datetime.now().isoformat()
+        }
+
+    wins = sum(r['wins'] for r in shard_results)
+    scores = []
+    games = []
+    for r in shard_results:
+        scores.extend(r['scores'])
+        for game in r.get('games', []):
+            games.append(dict(game, index=len(games)))
+    total_score = sum(scores)
+    execution_time = max(r['execution_time'] for r in shard_results)
+    return {
+        'layout': layout,
+        'num_games': num_games,
+        'wins': wins,
+        'win_rate': 100.0 * wins / num_games if num_games > 0 else 0.0,
+        'total_score': total_score,
+        'average_score': float(total_score) / num_games if num_games > 0 else 0.0,
+        'scores': scores,
+        'games': games,
+        'execution_time': execution_time,
+        'games_per_second': num_games / execution_time if execution_time > 0 else 0,
+        'shards': len(shard_results),
+        'workers': sorted(set(r.get('worker', '') for r in shard_results)),
+        'timestamp': datetime.now().isoformat(),
+        'success': True,
+        'error': None
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == 'worker':
+        pacman_dir = sys.argv[3] if len(sys.argv) > 3 else "."
+        run_worker(sys.argv[2], pacman_dir)
+    else:
+        print("Usage: python2 distributed.py worker <queue_dir> [pacman_dir]")
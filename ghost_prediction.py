@@ -0,0 +1,159 @@
+# ghost_prediction.py - Predict where ghosts will be over the next few moves
+#
+# Each layout gets a sparse ghost transition matrix, built once and cached.
+# A ghost's position distribution is propagated k steps ahead by repeated
+# sparse matrix-vector products, and the discounted occupancy is turned into
+# an expected-danger field over the whole board. Distributions are plain
+# dicts so the agent keeps running with the standard library only.
+#
+# Coordinates are map indices (row, column) as in mdpAgents.py, while ghost
+# positions from the api are (x, y) and may be fractional when scared.
+
+from layout_analysis import layout_key
+
+# Number of ghost moves to look ahead
+GHOST_LOOKAHEAD = 6
+
+# Row and column offsets of the four moves
+MOVES = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+REVERSE = {0: 1, 1: 0, 2: 3, 3: 2}
+
+_model_cache = {}
+
+
+class TransitionModel(object):
+    """Sparse ghost transition matrix for one layout and movement model.
+
+    States are (cell, heading) pairs. The 'random' model ignores the heading
+    and moves uniformly to any open neighbour. The 'directional' model
+    follows the Pacman ghost rules: a ghost never reverses unless it is in a
+    dead end, so the heading (index into MOVES) is part of the state.
+    """
+
+    def __init__(self, walls, h, w, model='random'):
+        if model not in ('random', 'directional'):
+            raise ValueError("Unknown ghost model: %s" % model)
+        self.model = model
+        walls = set(walls)
+        self.open_cells = set((i, j) for i in range(w) for j in range(h)
+                              if (j, i) not in walls)
+        self.rows = {}
+        for cell in self.open_cells:
+            if model == 'random':
+                self.rows[(cell, None)] = self._row(cell, None)
+            else:
+                for heading in range(len(MOVES)):
+                    self.rows[(cell, heading)] = self._row(cell, heading)
+
+    def _row(self, cell, heading):
+        """Outgoing transitions of one state as (next state, probability)"""
+        options = []
+        for d, (di, dj) in enumerate(MOVES):
+            n = (cell[0] + di, cell[1] + dj)
+            if n in self.open_cells:
+                options.append((n, d))
+        if heading is not None and len(options) > 1:
+            options = [o for o in options if o[1] != REVERSE[heading]]
+        if not options:
+            return [((cell, heading), 1.0)]
+        p = 1.0 / len(options)
+        if self.model == 'random':
+            return [((n, None), p) for (n, d) in options]
+        return [((n, d), p) for (n, d) in options]
+
+    def start(self, cell, heading=None):
+        """Initial distribution of a ghost seen at cell"""
+        if self.model == 'random':
+            return {(cell, None): 1.0}
+        if heading is not None:
+            return {(cell, heading): 1.0}
+        # Unknown heading: equally likely to be travelling any way
+        return dict(((cell, d), 1.0 / len(MOVES)) for d in range(len(MOVES)))
+
+    def step(self, distributions):
+        """One sparse matrix-vector product applied to a batch of distributions"""
+        result = []
+        for dist in distributions:
+            new_dist = {}
+            for state, p in dist.items():
+                for (n, q) in self.rows.get(state, [(state, 1.0)]):
+                    new_dist[n] = new_dist.get(n, 0.0) + p * q
+            result.append(new_dist)
+        return result
+
+
+def get_transition_model(walls, h, w, model='random'):
+    """Transition model for a layout, built once and cached"""
+    key = (layout_key(walls, h, w), model)
+    transitions = _model_cache.get(key)
+    if transitions is None:
+        transitions = TransitionModel(walls, h, w, model)
+        _model_cache[key] = transitions
+    return transitions
+
+
+class GhostPredictor(object):
+    """Expected ghost danger over the board for the next k ghost moves.
+
+    The danger of a cell is the probability that a ghost occupies it at step
+    k, weighted by 1 / k and summed over steps and ghosts, matching the
+    DANGER / distance falloff of the static danger zones. Fields are cached
+    per starting state, so after the first few moves of a game most lookups
+    cost one dict merge per ghost.
+    """
+
+    def __init__(self, walls, h, w, model='random', steps=GHOST_LOOKAHEAD):
+        self.transitions = get_transition_model(walls, h, w, model)
+        self.steps = steps
+        self.previous = None
+        self._fields = {}
+
+    def danger_field(self, ghosts):
+        """Map cell -> expected danger weight for the api ghost positions"""
+        cells = [(int(round(y)), int(round(x))) for (x, y) in ghosts]
+        headings = self._headings(cells)
+        self.previous = cells
+
+        field = {}
+        missing = []
+        for cell, heading in zip(cells, headings):
+            if cell not in self.transitions.open_cells:
+                continue
+            if (cell, heading) not in self._fields:
+                missing.append((cell, heading))
+
+        if missing:
+            self._predict(missing)
+
+        for cell, heading in zip(cells, headings):
+            for c, weight in self._fields.get((cell, heading), {}).items():
+                field[c] = field.get(c, 0.0) + weight
+        return field
+
+    def _predict(self, starts):
+        """Propagate a batch of ghosts k steps and cache their danger fields"""
+        distributions = [self.transitions.start(cell, heading)
+                         for (cell, heading) in starts]
+        fields = [{} for s in starts]
+        for k in range(1, self.steps + 1):
+            distributions = self.transitions.step(distributions)
+            for dist, field in zip(distributions, fields):
+                for (cell, heading), p in dist.items():
+                    field[cell] = field.get(cell, 0.0) + p / k
+        for start, field in zip(starts, fields):
+            self._fields[start] = field
+
+    def _headings(self, cells):
+        """Infer each ghost's heading from its previous position"""
+        if self.transitions.model == 'random':
+            return [None] * len(cells)
+        headings = []
+        for index, cell in enumerate(cells):
+            heading = None
+            if self.previous is not None and index < len(self.previous):
+                last = self.previous[index]
+                delta = (cell[0] - last[0], cell[1] - last[1])
+                if delta in MOVES:
+                    heading = MOVES.index(delta)
+            headings.append(heading)
+        return headings
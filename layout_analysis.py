@@ -0,0 +1,302 @@
+# layout_analysis.py - One-time structural analysis of Pacman layouts
+#
+# Collapses the corridors of a layout into a graph of junctions and dead ends
+# so that long-range planning does not have to push values along every
+# corridor one cell at a time, and grades every cell by how easily Pacman
+# can be trapped there.
+#
+# All coordinates are map indices (row, column), i.e. the (y, x) order used
+# by the value maps in mdpAgents.py.
+
+# Convergence threshold and sweep cap for the coarse graph value iteration
+GRAPH_TOLERANCE = 0.001
+GRAPH_SWEEP_LIMIT = 200
+# Sweep cap once the node values are warm-started from the previous move
+GRAPH_WARM_SWEEP_LIMIT = 10
+
+# Moves into a dead end at which a cell counts as fully trapped
+TRAP_DEPTH = 4
+# Corridor length (in moves between junctions) at which a corridor is as
+# hazardous as CORRIDOR_HAZARD
+LONG_CORRIDOR = 8
+# Hazard of the longest corridors, relative to the deepest dead ends
+CORRIDOR_HAZARD = 0.5
+
+_graph_cache = {}
+_hazard_cache = {}
+
+
+def layout_key(walls, h, w):
+    """Hashable key identifying a layout by its size and wall positions"""
+    return (h, w, frozenset(walls))
+
+
+def open_neighbours(cell, open_cells):
+    """Open cells next to cell in the four compass directions"""
+    i = cell[0]
+    j = cell[1]
+    return [n for n in [(i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)]
+            if n in open_cells]
+
+
+class Edge(object):
+    """A corridor between two graph nodes.
+
+    cells holds the corridor cells in order from start to end, excluding the
+    two end nodes, so length is the number of moves from start to end.
+    """
+
+    def __init__(self, start, end, cells):
+        self.start = start
+        self.end = end
+        self.cells = cells
+        self.length = len(cells) + 1
+        self.food_count = 0
+        self.has_capsule = False
+
+
+class JunctionGraph(object):
+    """Junctions and dead ends of a layout joined by corridor edges"""
+
+    def __init__(self, walls, h, w):
+        self.h = h
+        self.w = w
+        # walls come from the api as (x, y) positions
+        walls = set(walls)
+        self.open_cells = set((i, j) for i in range(w) for j in range(h)
+                              if (j, i) not in walls)
+        self.nodes = []
+        self.edges = []
+        self.node_edges = {}
+        self.cell_edge = {}
+        self._build()
+        self.node_index = dict((node, k) for k, node in enumerate(self.nodes))
+
+    def _build(self):
+        degree = dict((c, len(open_neighbours(c, self.open_cells)))
+                      for c in self.open_cells)
+        nodes = set(c for c in self.open_cells if degree[c] != 2)
+
+        # Loops made only of corridor cells still need one node to anchor them
+        unvisited = set(c for c in self.open_cells if c not in nodes)
+        while unvisited:
+            start = min(unvisited)
+            component = set([start])
+            frontier = [start]
+            anchored = False
+            while frontier:
+                current = frontier.pop()
+                for n in open_neighbours(current, self.open_cells):
+                    if n in nodes:
+                        anchored = True
+                    elif n not in component:
+                        component.add(n)
+                        frontier.append(n)
+            if not anchored:
+                nodes.add(start)
+            unvisited -= component
+
+        self.nodes = sorted(nodes)
+        for node in self.nodes:
+            self.node_edges[node] = []
+
+        walked = set()
+        for node in self.nodes:
+            for first in open_neighbours(node, self.open_cells):
+                if (node, first) in walked:
+                    continue
+                cells = []
+                previous = node
+                current = first
+                while current not in nodes:
+                    cells.append(current)
+                    step = [n for n in open_neighbours(current, self.open_cells)
+                            if n != previous]
+                    previous = current
+                    current = step[0]
+                walked.add((node, first))
+                walked.add((current, previous))
+                edge = Edge(node, current, cells)
+                self.edges.append(edge)
+                self.node_edges[node].append(edge)
+                if current != node:
+                    self.node_edges[current].append(edge)
+                for cell in cells:
+                    self.cell_edge[cell] = edge
+
+    def update_contents(self, food, capsules):
+        """Refresh the food count and capsule flag of every edge"""
+        for edge in self.edges:
+            edge.food_count = 0
+            edge.has_capsule = False
+        for (x, y) in food:
+            edge = self.cell_edge.get((y, x))
+            if edge is not None:
+                edge.food_count += 1
+        for (x, y) in capsules:
+            edge = self.cell_edge.get((y, x))
+            if edge is not None:
+                edge.has_capsule = True
+
+    def value_map(self, r_map, gamma, values=None):
+        """Coarse value of every open cell computed on the junction graph.
+
+        Each edge is summarised by the discounted reward collected walking
+        it in either direction, the node values are iterated with
+        deterministic moves, and corridor cells then take the better of
+        walking out either end. Walls stay None, like the maps in mdpAgents.
+
+        The node values are updated in place (Gauss-Seidel) in the values
+        list, which the caller keeps for its next move. An empty list is
+        filled and iterated to convergence; a filled one holds the previous
+        move's values, which change little between moves, so at most
+        GRAPH_WARM_SWEEP_LIMIT sweeps run. The graph itself is cached per
+        layout and shared, so it keeps no values of its own.
+        """
+        index = self.node_index
+        traversals = [[] for node in self.nodes]
+        for edge in self.edges:
+            forward = self._discounted(edge.cells, r_map, gamma)
+            backward = self._discounted(edge.cells[::-1], r_map, gamma)
+            decay = gamma ** (edge.length - 1)
+            traversals[index[edge.start]].append((forward, decay, index[edge.end]))
+            traversals[index[edge.end]].append((backward, decay, index[edge.start]))
+
+        rewards = [float(r_map[i][j]) for (i, j) in self.nodes]
+        if values is None:
+            values = []
+        limit = GRAPH_WARM_SWEEP_LIMIT
+        if len(values) != len(rewards):
+            values[:] = rewards
+            limit = GRAPH_SWEEP_LIMIT
+        for sweep in range(limit):
+            delta = 0.0
+            for k in range(len(values)):
+                best = None
+                for (reward, decay, other) in traversals[k]:
+                    value = reward + decay * values[other]
+                    if best is None or value > best:
+                        best = value
+                if best is None:
+                    best = 0.0
+                value = rewards[k] + gamma * best
+                delta = max(delta, abs(value - values[k]))
+                values[k] = value
+            if delta < GRAPH_TOLERANCE:
+                break
+
+        m = [[None] * self.h for i in range(self.w)]
+        for k, node in enumerate(self.nodes):
+            m[node[0]][node[1]] = values[k]
+        for edge in self.edges:
+            # Walking towards the end node, then towards the start node
+            towards_end = []
+            value = values[index[edge.end]]
+            for cell in reversed(edge.cells):
+                value = r_map[cell[0]][cell[1]] + gamma * value
+                towards_end.append(value)
+            towards_end.reverse()
+            value = values[index[edge.start]]
+            for k, cell in enumerate(edge.cells):
+                value = r_map[cell[0]][cell[1]] + gamma * value
+                m[cell[0]][cell[1]] = max(value, towards_end[k])
+        return m
+
+    def _discounted(self, cells, r_map, gamma):
+        """Discounted reward of walking cells in order"""
+        total = 0.0
+        for cell in reversed(cells):
+            total = r_map[cell[0]][cell[1]] + gamma * total
+        return total
+
+
+def get_junction_graph(walls, h, w):
+    """Junction graph for a layout, built once and cached"""
+    key = layout_key(walls, h, w)
+    graph = _graph_cache.get(key)
+    if graph is None:
+        graph = JunctionGraph(walls, h, w)
+        _graph_cache[key] = graph
+    return graph
+
+
+class HazardMap(object):
+    """Static trap geometry of a layout, from 0 (open junction) to 1 (trap).
+
+    Dead ends are found by repeatedly peeling off cells with a single open
+    neighbour; what is left is the part of the layout where Pacman can run
+    in circles. For every open cell this records:
+
+    dead_end_depth -- moves from the mouth of its dead end (0 outside them)
+    corridor_length -- length of the corridor it lies on (0 at junctions)
+    escape_routes -- directions that do not lead into a dead end
+
+    grid holds the combined hazard as a map with walls as None.
+    """
+
+    def __init__(self, walls, h, w):
+        self.h = h
+        self.w = w
+        graph = get_junction_graph(walls, h, w)
+        walls = set(walls)
+        open_cells = set((i, j) for i in range(w) for j in range(h)
+                         if (j, i) not in walls)
+
+        # Peel dead ends from their tips inwards
+        degree = dict((c, len(open_neighbours(c, open_cells))) for c in open_cells)
+        core = set(open_cells)
+        frontier = [c for c in open_cells if degree[c] <= 1]
+        last = frontier
+        while frontier:
+            core.difference_update(frontier)
+            last = frontier
+            peeled = []
+            for cell in frontier:
+                for n in open_neighbours(cell, core):
+                    degree[n] -= 1
+                    if degree[n] == 1:
+                        peeled.append(n)
+            frontier = peeled
+        if not core:
+            # A layout without loops: measure from the cells peeled last
+            core = set(last)
+
+        # Depth of dead-end cells, walking in from the core
+        self.dead_end_depth = dict((c, 0) for c in core)
+        frontier = sorted(core)
+        while frontier:
+            deeper = []
+            for cell in frontier:
+                for n in open_neighbours(cell, open_cells):
+                    if n not in self.dead_end_depth:
+                        self.dead_end_depth[n] = self.dead_end_depth[cell] + 1
+                        deeper.append(n)
+            frontier = deeper
+
+        self.corridor_length = {}
+        self.escape_routes = {}
+        self.grid = [[None] * h for i in range(w)]
+        for cell in open_cells:
+            edge = graph.cell_edge.get(cell)
+            self.corridor_length[cell] = edge.length if edge is not None else 0
+            depth = self.dead_end_depth.get(cell, 0)
+            if depth > 0:
+                self.escape_routes[cell] = 1
+                hazard = min(1.0, float(depth) / TRAP_DEPTH)
+            else:
+                self.escape_routes[cell] = len(open_neighbours(cell, core))
+                hazard = 0.0
+                if self.escape_routes[cell] <= 2:
+                    hazard = CORRIDOR_HAZARD * min(
+                        1.0, float(self.corridor_length[cell]) / LONG_CORRIDOR)
+            self.grid[cell[0]][cell[1]] = hazard
+
+
+def get_hazard_map(walls, h, w):
+    """Hazard map for a layout, built once and cached"""
+    key = layout_key(walls, h, w)
+    hazards = _hazard_cache.get(key)
+    if hazards is None:
+        hazards = HazardMap(walls, h, w)
+        _hazard_cache[key] = hazards
+    return hazards
@@ -13,8 +13,28 @@ import api
 import util
 from game import Agent
 from pacman import Directions
+import os
+import sys
+import json
 import time
+import hashlib
 from visualization import create_visualizer
+from layout_analysis import get_junction_graph, get_hazard_map
+from ghost_prediction import GhostPredictor
+from array_backend import ArrayBackend
+from parallel_backend import get_parallel_backend
+from policy_iteration import PolicySolver
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc, memory tracking then falls back to the
+    # process's peak resident set size
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # Optimized parameters from systematic tuning - 133% win rate improvement
 EMPTY_LOCATION_REWARD = -0.06
@@ -27,16 +47,200 @@ DANGER_ZONE_RATIO = 7
 DANGER = 400
 ITERATIONS = 8
 
+# Reward taken off empty cells at full trap hazard (deep in a dead end), see
+# layout_analysis.HazardMap. Off by default: on recorded-state comparisons it
+# changes a few moves without avoiding any more ghost contacts, and no game
+# benchmark has shown a gain yet, so it is left to the tuner
+HAZARD_PENALTY = 0.0
+
+# Parameters that can be overridden per run with -a, e.g. -a GAMMA=0.95
+TUNABLE_PARAMETERS = ['EMPTY_LOCATION_REWARD', 'FOOD_REWARD', 'CAPSULE_REWARD',
+                      'GHOST_REWARD', 'GAMMA', 'DANGER_ZONE_RATIO', 'DANGER',
+                      'ITERATIONS', 'HAZARD_PENALTY']
+
+# Anytime planning: seconds allowed per move (0 disables the deadline)
+MOVE_TIME_BUDGET = 0
+
+# Localized planning: only sweep cells within reach of Pacman's next move
+LOCAL_PLANNING = False
+
+# Long-range planning on the junction graph, cell sweeps only near Pacman
+GRAPH_PLANNING = False
+
+# Predicted ghost occupancy instead of static danger zones: None, 'random'
+# or 'directional'
+GHOST_MODEL = None
+
+# Value grid storage: 'list' (list-of-lists maps), 'array' (flat
+# double-buffered array('d') grids, same results with less allocation) or
+# 'parallel' (array grids in shared memory whose full sweeps are split over
+# PLANNER_WORKERS processes, for very large layouts on multi-core hosts;
+# 0 workers means one per CPU)
+PLANNER_BACKEND = 'list'
+PLANNER_WORKERS = 0
+
+# Solver: 'value' (ITERATIONS sweeps of value iteration) or 'policy' (policy
+# iteration to the converged values, warm-started from the previous move)
+PLANNER_SOLVER = 'value'
+
+# Record tracemalloc peak and net allocations per move and per game (on
+# Python 2 only the peak resident set size per game)
+MEMORY_TRACKING = False
+
+# Directory for value-map heatmap frames of every move ('ppm' images or
+# 'ansi' text), written by a background thread; None disables them
+HEATMAP_DIR = None
+HEATMAP_FORMAT = 'ppm'
+
+# File the state of every turn is appended to as a JSON line (a snapshot
+# plus the legal moves), for replaying decisions offline; None disables it
+RECORD_STATES = None
+
+# Cross-game warm start: converged value maps of each layout's opening state
+# are saved under VALUE_CACHE_DIR, keyed by layout and parameters, and new
+# games start from them with WARM_START_SWEEPS sweeps for OPENING_MOVES moves
+WARM_START = False
+VALUE_CACHE_DIR = 'value_cache'
+WARM_START_SWEEPS = 4
+OPENING_MOVES = 10
+CONVERGENCE_TOLERANCE = 0.01
+CONVERGENCE_SWEEP_LIMIT = 300
+
 
 class MDPAgent(Agent):
-    def __init__(self):
+    def __init__(self, time_budget=None, local_planning=None,
+                 graph_planning=None, ghost_model=None, backend=None,
+                 profile=None, memory=None, warm_start=None,
+                 solver=None, workers=None, heatmap=None, heatmap_format=None,
+                 record=None, **parameters):
+        apply_parameters(parameters)
         self.map = self.walls = self.corners = None
-        self.visualizer = create_visualizer(enable_logging=True)
+
+        # Heatmap frames of the value map, -a heatmap=frames,heatmap_format=ansi
+        if heatmap is None:
+            heatmap = HEATMAP_DIR
+        if heatmap_format is None:
+            heatmap_format = HEATMAP_FORMAT
+        self.visualizer = create_visualizer(enable_logging=True, heatmap_dir=heatmap,
+                                            heatmap_format=heatmap_format)
+
+        # Per-move deadline, can be overridden with -a time_budget=0.5
+        if time_budget is None:
+            time_budget = MOVE_TIME_BUDGET
+        self.time_budget = float(time_budget)
+        self.budget_hits = 0
+        self.budget_overruns = 0
+        self.moves = 0
+
+        # Horizon-bounded planning, -a local_planning=1
+        if local_planning is None:
+            local_planning = LOCAL_PLANNING
+        self.local_planning = as_flag(local_planning)
+
+        # Junction-graph abstraction for distant food, -a graph_planning=1
+        if graph_planning is None:
+            graph_planning = GRAPH_PLANNING
+        self.graph_planning = as_flag(graph_planning)
+
+        # Ghost occupancy prediction, -a ghost_model=directional
+        if ghost_model is None:
+            ghost_model = GHOST_MODEL
+        self.ghost_model = ghost_model
+        self.ghost_predictor = None
+
+        # Value grid storage, -a backend=array or -a backend=parallel,workers=4
+        if backend is None:
+            backend = PLANNER_BACKEND
+        if backend not in ('list', 'array', 'parallel'):
+            raise ValueError("Unknown planner backend: %s" % backend)
+        self.backend_name = backend
+        self.backend = None
+        if workers is None:
+            workers = PLANNER_WORKERS
+        self.workers = int(workers)
+
+        # Policy iteration instead of fixed value iteration, -a solver=policy
+        if solver is None:
+            solver = PLANNER_SOLVER
+        if solver not in ('value', 'policy'):
+            raise ValueError("Unknown planner solver: %s" % solver)
+        self.solver_name = solver
+        self.policy_solver = None
+
+        # cProfile capture of getAction only, -a profile=agent.pstats. The
+        # method is only wrapped when profiling, so it costs nothing otherwise.
+        self.profiler = None
+        self.profile_path = profile
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.getAction = self._profiled_get_action
+
+        # tracemalloc accounting per move and per game, -a memory=1
+        if memory is None:
+            memory = MEMORY_TRACKING
+        self.memory_tracking = as_flag(memory)
+        self.rss_tracking = False
+        if self.memory_tracking and tracemalloc is None:
+            self.memory_tracking = False
+            if resource is not None:
+                print("No tracemalloc (Python 3.4+), tracking peak RSS per game instead")
+                self.rss_tracking = True
+            else:
+                print("Memory tracking needs tracemalloc or resource, disabled")
+        if self.memory_tracking and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.move_memory = []
+        self.game_memory_start = 0
+        self.game_memory_peak = 0
+        self.game_rss_start = 0
+
+        # Start games from cached converged value maps, -a warm_start=1
+        if warm_start is None:
+            warm_start = WARM_START
+        self.warm_start = as_flag(warm_start)
+        self.warm_started = False
+
+        self.games_started = 0
+
+        # Turn-by-turn state recording, -a record=states.jsonl
+        if record is None:
+            record = RECORD_STATES
+        self.record_path = record
+        self.record_file = None
 
     def registerInitialState(self, state):
         self.walls = api.walls(state)
         self.corners = api.corners(state)
         self.map = initial_map(self.corners, self.walls)
+        self.budget_hits = 0
+        self.budget_overruns = 0
+        self.moves = 0
+        # Junction graph node values of this game, warm-starting the next move
+        self.graph_values = []
+        h = self.corners[1][0] + 1
+        w = self.corners[2][1] + 1
+        if self.ghost_model:
+            self.ghost_predictor = GhostPredictor(self.walls, h, w, self.ghost_model)
+        if self.backend_name == 'array':
+            self.backend = ArrayBackend(self.walls, h, w)
+        if self.backend_name == 'parallel':
+            # Workers are kept per layout and reused by later games
+            self.backend = get_parallel_backend(self.walls, h, w, self.workers)
+        if self.solver_name == 'policy':
+            self.policy_solver = PolicySolver(self.walls, h, w)
+        if self.memory_tracking:
+            self.move_memory = []
+            self.game_memory_start = tracemalloc.get_traced_memory()[0]
+            self.game_memory_peak = 0
+        if self.rss_tracking:
+            self.game_rss_start = max_rss()
+        self.warm_started = False
+        if self.warm_start:
+            self.load_warm_start(state)
+        self.games_started += 1
+        if self.record_path and self.record_file is None:
+            self.record_file = open(self.record_path, 'a')
         
         print("\n=== GAME STARTED ===")
         print("Food pellets: %d" % len(api.food(state)))
@@ -53,34 +257,139 @@ class MDPAgent(Agent):
         print("\n=== GAME FINISHED ===")
         print("Result: %s" % result)
         print("Food remaining: %d" % food_left)
+        if self.time_budget > 0:
+            print("Time budget hits: %d/%d moves (%d overran with one sweep)" %
+                  (self.budget_hits, self.moves, self.budget_overruns))
+        
+        memory = None
+        if self.memory_tracking:
+            memory = self.memory_summary()
+        elif self.rss_tracking:
+            peak = max_rss()
+            memory = {'moves': self.moves, 'max_rss': peak,
+                      'game_rss_growth': peak - self.game_rss_start}
+        if memory is not None:
+            print("Memory usage: " + ' '.join('%s=%s' % (k, memory[k]) for k in sorted(memory)))
         
         # Log game result for visualization analysis
-        self.visualizer.log_game_result(state, won, None)
+        self.visualizer.log_game_result(state, won, None, memory)
+
+        if self.record_file is not None:
+            self.record_file.flush()
+
+        # Profile accumulates over all games played by this agent
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile_path)
+
+    def load_warm_start(self, state):
+        """Start from the cached converged map, computing and saving it if missing"""
+        path = value_cache_path(self.walls, self.corners, self.ghost_model)
+        cached = load_value_map(path)
+        if cached is not None:
+            self.map = cached
+            self.warm_started = True
+            print("Warm start: loaded %s" % path)
+            return
+
+        stats = {}
+        converged = value_iteration(self.map, state, stats=stats,
+                                    predictor=self.ghost_predictor,
+                                    iterations=CONVERGENCE_SWEEP_LIMIT,
+                                    tolerance=CONVERGENCE_TOLERANCE)
+        if isinstance(converged, list):
+            self.map = converged
+        else:
+            self.map = converged.to_list()
+        self.warm_started = True
+        save_value_map(path, self.map, stats['sweeps'])
+        print("Warm start: converged in %d sweeps, saved %s" % (stats['sweeps'], path))
+
+    def _profiled_get_action(self, state):
+        return self.profiler.runcall(MDPAgent.getAction, self, state)
+
+    def memory_summary(self):
+        """Allocation stats of the current game in bytes"""
+        peaks = [peak for (peak, net) in self.move_memory if peak is not None]
+        nets = [net for (peak, net) in self.move_memory]
+        return {
+            'moves': len(self.move_memory),
+            'move_peak_max': max(peaks) if peaks else 0,
+            'move_peak_mean': sum(peaks) // len(peaks) if peaks else 0,
+            'move_net_mean': sum(nets) // len(nets) if nets else 0,
+            'game_peak': self.game_memory_peak,
+            'game_net': tracemalloc.get_traced_memory()[0] - self.game_memory_start
+        }
 
     def getAction(self, state):
         if self.map is None:
             self.registerInitialState(state)
 
+        if self.memory_tracking:
+            # Peaks can only be measured per move where reset_peak exists (3.9+)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
         # Run value iteration to update our policy
         print("\n--- Value Iteration Step ---")
         start_time = time.time()
-        self.map = value_iteration(self.map, state)
-        decision_time = time.time() - start_time
-        
+        deadline = None
+        if self.time_budget > 0:
+            deadline = start_time + self.time_budget
+        # A warm-started map is already converged for the opening
+        iterations = ITERATIONS
+        if self.warm_started and self.moves < OPENING_MOVES:
+            iterations = min(WARM_START_SWEEPS, ITERATIONS)
         legal = api.legalActions(state)
         if Directions.STOP in legal:
             legal.remove(Directions.STOP)
 
+        if self.record_file is not None:
+            record = snapshot_state(state)
+            record['legal'] = legal
+            record['game'] = self.games_started
+            record['move'] = self.moves + 1
+            self.record_file.write(json.dumps(record) + '\n')
+
+        stats = {'budget_hit': False, 'overrun': False}
+        if self.policy_solver is not None:
+            r_map = build_reward_map(snapshot_state(state), self.ghost_predictor)
+            self.map = self.policy_solver.solve(r_map, GAMMA, deadline, stats)
+            print("  Policy iteration: %d improvement steps, %d evaluation sweeps, %.3fs" %
+                  (stats['iterations'], stats['sweeps'], stats['time']))
+        else:
+            self.map = value_iteration(self.map, state, deadline, stats,
+                                       iterations=iterations,
+                                       local=self.local_planning,
+                                       graph=self.graph_planning,
+                                       predictor=self.ghost_predictor,
+                                       backend=self.backend,
+                                       graph_values=self.graph_values)
+        decision_time = time.time() - start_time
+        self.moves += 1
+        if stats['overrun']:
+            # The budget was gone before planning started; one sweep ran anyway
+            self.budget_overruns += 1
+            print("  Time budget used up before the first sweep, ran one anyway")
+        elif stats['budget_hit']:
+            self.budget_hits += 1
+            if self.policy_solver is not None:
+                print("  Time budget hit after %d evaluation sweeps" % stats['sweeps'])
+            else:
+                print("  Time budget hit after %d/%d sweeps" % (stats['sweeps'], iterations))
+
         pacman = api.whereAmI(state)
-        [scores, actions] = get_action_scores(legal, self.map, pacman[0], pacman[1])
+        choice, action_scores = choose_action(self.map, pacman, legal)
         
         # Visualize current game state with value function overlay
-        self.visualizer.visualize_game_state(state, self.map, pacman)
+        self.visualizer.visualize_game_state(state, self.map, pacman,
+                                             stats.get('sweeps', ITERATIONS),
+                                             action_scores, choice, api.ghosts(state))
         
         # Decision making process
         print("Current position: %s" % str(pacman))
         print("Legal actions: %s" % str(legal))
-        print("Action scores: %s" % str(dict(zip(actions, scores))))
+        print("Action scores: %s" % str(action_scores))
         
         # Analyze the situation
         food_count = len(api.food(state))
@@ -101,14 +410,19 @@ class MDPAgent(Agent):
             else:
                 print("  - SAFE: Ghost far away")
         
-        max_score_index = scores.index(max(scores))
-        choice = actions[max_score_index]
-        
         # Log detailed decision for analysis
-        self.visualizer.log_decision(state, dict(zip(actions, scores)), choice, decision_time)
+        self.visualizer.log_decision(state, action_scores, choice, decision_time)
+        
+        print("Decision: %s (score: %.2f)" % (choice, action_scores[choice]))
+        print("Decision time: %.4f seconds" % decision_time)
         
-        print("Decision: %s (score: %.2f)" % (choice, scores[max_score_index]))
-        print("Decision time: %.3f seconds" % decision_time)
+        if self.memory_tracking:
+            current, peak = tracemalloc.get_traced_memory()
+            move_peak = None
+            if hasattr(tracemalloc, 'reset_peak'):
+                move_peak = peak - memory_before
+                self.game_memory_peak = max(self.game_memory_peak, peak - self.game_memory_start)
+            self.move_memory.append((move_peak, current - memory_before))
         
         return api.makeMove(choice, legal)
 
@@ -133,43 +447,211 @@ def get_action_scores(legal, pacman_map, x, y):
     return [scores, actions]
 
 
-def value_iteration(m, state):
-    iterations = ITERATIONS
-    corners = api.corners(state)
-    food = api.food(state)
-    walls = api.walls(state)
-    ghosts = api.ghosts(state)
-    capsules = api.capsules(state)
-
-    # Create reward map based on current state
-    r_map = reward_map(corners, food, walls, ghosts, capsules)
+def choose_action(m, pacman, legal):
+    """Best legal move on a value map and the scores of all moves"""
+    legal = [a for a in legal if a != Directions.STOP]
+    [scores, actions] = get_action_scores(legal, m, pacman[0], pacman[1])
+    choice = actions[scores.index(max(scores))]
+    return choice, dict(zip(actions, scores))
+
+
+def value_iteration(m, state, deadline=None, stats=None, local=False,
+                    graph=False, predictor=None, backend=None, iterations=None,
+                    tolerance=None, graph_values=None):
+    """Run value iteration for a game state, see plan_values"""
+    return plan_values(m, snapshot_state(state), deadline, stats, local, graph,
+                       predictor, backend, iterations, tolerance, graph_values)
+
+
+def snapshot_state(state):
+    """Plain-data copy of everything the planner reads from a game state"""
+    return {
+        'corners': api.corners(state),
+        'food': api.food(state),
+        'walls': api.walls(state),
+        'ghosts': api.ghosts(state),
+        'capsules': api.capsules(state),
+        'pacman': api.whereAmI(state)
+    }
+
+
+def restore_snapshot(data):
+    """Snapshot decoded from JSON, with positions turned back into tuples"""
+    snap = {}
+    for key in ['corners', 'food', 'walls', 'ghosts', 'capsules']:
+        snap[key] = [tuple(p) for p in data[key]]
+    snap['pacman'] = tuple(data['pacman'])
+    for key in data:
+        if key not in snap:
+            snap[key] = data[key]
+    return snap
+
+
+def build_reward_map(snap, predictor=None):
+    """Reward map of a snapshot, including the danger zones around ghosts"""
+    corners = snap['corners']
+    r_map = reward_map(corners, snap['food'], snap['walls'], snap['ghosts'],
+                       snap['capsules'])
 
     h = corners[1][0] + 1
     w = corners[2][1] + 1
+    pacman = (snap['pacman'][1], snap['pacman'][0])
 
-    pacman = api.whereAmI(state)
-    pacman = (pacman[1], pacman[0])
-    
     # Apply danger zones around ghosts
-    update_reward_map(r_map, pacman, ghosts, h, w)
+    if predictor is not None:
+        apply_predicted_danger(r_map, predictor.danger_field(snap['ghosts']))
+    else:
+        update_reward_map(r_map, pacman, snap['ghosts'], h, w)
+    return r_map
+
+
+def plan_values(m, snap, deadline=None, stats=None, local=False, graph=False,
+                predictor=None, backend=None, iterations=None, tolerance=None,
+                graph_values=None):
+    """Run up to ITERATIONS Bellman sweeps on a snapshot_state() dict, stopping at the deadline"""
+    if iterations is None:
+        iterations = ITERATIONS
+    corners = snap['corners']
+    food = snap['food']
+    walls = snap['walls']
+    capsules = snap['capsules']
+
+    # Create reward map based on current state, with predicted ghost
+    # occupancy instead of the BFS danger zones when a predictor is given
+    r_map = build_reward_map(snap, predictor)
+
+    h = corners[1][0] + 1
+    w = corners[2][1] + 1
+
+    pacman = (snap['pacman'][1], snap['pacman'][0])
+
+    # Seed the map from the junction graph, which carries distant food along
+    # whole corridors at once; the sweeps below then only refine near Pacman.
+    # graph_values holds the caller's node values from its previous move.
+    if graph:
+        junctions = get_junction_graph(walls, h, w)
+        junctions.update_contents(food, capsules)
+        m = junctions.value_map(r_map, GAMMA, graph_values)
+        print("  Junction graph: %d nodes, %d edges, %d corridor food" %
+              (len(junctions.nodes), len(junctions.edges),
+               sum(e.food_count for e in junctions.edges)))
+
+    # Only sweep cells near Pacman; the rest keep their previous values and
+    # act as a fixed boundary, which cannot reach Pacman's neighbours in time.
+    # The radius follows the planned sweeps, not the ones a deadline lets
+    # complete: after fewer sweeps the outer ring has simply been updated
+    # without its change reaching Pacman yet, so the move is the one a full
+    # sweep would give and the extra cells only cost sweep time, which the
+    # deadline check already measures. Those values also carry into the map
+    # the next move starts from.
+    cells = None
+    if local or graph:
+        cells = local_region(pacman, r_map, h, w, iterations + 1)
+        print("  Local planning region: %d of %d cells" % (len(cells), h * w))
+
+    # The backend sweeps its own flat buffers and returns a read-only view,
+    # which can be passed straight back in on the next move
+    positions = None
+    if backend is not None:
+        if m is not backend.view:
+            backend.load(m)
+        backend.set_rewards(r_map)
+        if cells is not None:
+            positions = backend.positions(cells)
+            backend.begin_partial()
 
     print("  Running %d value iteration steps..." % iterations)
     
     # Value iteration algorithm
+    start = time.time()
+    sweeps = 0
+    sweep_time = 0.0
+    budget_hit = False
+    overrun = False
+    converged = False
     while iterations > 0:
-        new_m = initial_map(corners, walls)
-
-        for i in range(w):
-            for j in range(h):
-                r = r_map[i][j]
-                new_m[i][j] = bellmann(m, (i, j), w, h, r)
+        # Only start a sweep we expect to complete before the deadline, but
+        # always run one so the move never ignores this turn's ghosts
+        sweep_start = time.time()
+        if deadline is not None and sweep_start + sweep_time > deadline:
+            budget_hit = True
+            if sweeps > 0:
+                break
+            overrun = True
+
+        if backend is not None:
+            backend.sweep(GAMMA, positions)
+            new_m = backend.view
+        elif cells is not None:
+            new_m = [row[:] for row in m]
+            for (i, j) in cells:
+                new_m[i][j] = bellmann(m, (i, j), w, h, r_map[i][j])
+        else:
+            new_m = initial_map(corners, walls)
+
+            for i in range(w):
+                for j in range(h):
+                    r = r_map[i][j]
+                    new_m[i][j] = bellmann(m, (i, j), w, h, r)
+        # Stop early once no value changes by more than the tolerance
+        if tolerance is not None:
+            if backend is not None:
+                change = backend.max_change(positions)
+            else:
+                change = max_change(m, new_m, cells)
+            converged = change < tolerance
         m = new_m
         iterations -= 1
+        sweeps += 1
+        sweep_time = time.time() - sweep_start
+        if converged:
+            break
+
+    # 'overrun' marks moves whose one forced sweep started past the deadline
+    if stats is not None:
+        stats['sweeps'] = sweeps
+        stats['budget_hit'] = budget_hit
+        stats['overrun'] = overrun
+        stats['converged'] = converged
+        stats['time'] = time.time() - start
 
     print("  Value iteration complete")
     return m
 
 
+def max_change(old, new, cells=None):
+    """Largest absolute difference between two value maps"""
+    if cells is None:
+        cells = [(i, j) for i in range(len(new)) for j in range(len(new[i]))]
+    change = 0.0
+    for (i, j) in cells:
+        if new[i][j] is not None:
+            change = max(change, abs(new[i][j] - old[i][j]))
+    return change
+
+
+def local_region(pacman, r_map, h, w, radius):
+    """Open cells within radius steps of Pacman, found by BFS over the map"""
+    frontier = util.Queue()
+    frontier.push(pacman)
+    distance = {pacman: 0}
+    cells = []
+
+    while not frontier.isEmpty():
+        current = frontier.pop()
+        cells.append(current)
+        if distance[current] >= radius:
+            continue
+        x = current[0]
+        y = current[1]
+        for n in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if 0 <= n[0] < w and 0 <= n[1] < h and n not in distance \
+                    and r_map[n[0]][n[1]] is not None:
+                distance[n] = distance[current] + 1
+                frontier.push(n)
+    return cells
+
+
 def bellmann(m, cell, w, h, r):
     """Bellman equation for value iteration"""
     x = cell[0]
@@ -237,6 +719,13 @@ def update_reward_map(r_map, pacman, ghosts, h, w):
                         r_map[cell[0]][cell[1]] -= (DANGER / distance)
 
 
+def apply_predicted_danger(r_map, field):
+    """Subtract the expected ghost danger of every cell from the reward map"""
+    for (i, j), weight in field.items():
+        if r_map[i][j] is not None:
+            r_map[i][j] -= DANGER * weight
+
+
 def distance_to_closest_ghost(cell, ghosts, h, w):
     """Find distance to closest ghost using BFS"""
     frontier = util.Queue()
@@ -266,6 +755,75 @@ def distance_to_closest_ghost(cell, ghosts, h, w):
         return [0, cells]
 
 
+def apply_parameters(overrides):
+    """Override tunable module parameters, e.g. from -a GAMMA=0.95,DANGER=500"""
+    for name, value in overrides.items():
+        if name not in TUNABLE_PARAMETERS:
+            raise TypeError("Unknown agent argument: %s" % name)
+        value = float(value)
+        if isinstance(globals()[name], int) and value == int(value):
+            value = int(value)
+        globals()[name] = value
+
+
+def parameter_values():
+    """Current values of the tunable parameters"""
+    return dict((name, globals()[name]) for name in TUNABLE_PARAMETERS)
+
+
+def value_cache_path(walls, corners, ghost_model=None):
+    """Cache file for a layout's converged map under the current parameters"""
+    h = corners[1][0] + 1
+    w = corners[2][1] + 1
+    layout = hashlib.md5(json.dumps([h, w, sorted(walls)]).encode('utf-8'))
+    parameters = parameter_values()
+    # The converged map does not depend on the number of sweeps per move
+    del parameters['ITERATIONS']
+    parameters['ghost_model'] = ghost_model
+    params = hashlib.md5(json.dumps(parameters, sort_keys=True).encode('utf-8'))
+    return os.path.join(VALUE_CACHE_DIR, '%s_%s.json' % (layout.hexdigest()[:12],
+                                                         params.hexdigest()[:12]))
+
+
+def load_value_map(path):
+    """Value map saved by save_value_map, or None if there is none"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)['map']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def save_value_map(path, m, sweeps):
+    """Write a value map atomically so concurrent games never read half a file"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+    data = {'map': m, 'sweeps': sweeps, 'parameters': parameter_values(),
+            'saved': time.time()}
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp_path, path)
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+def as_flag(value):
+    """Interpret an agent argument such as '1' or 'true' as a boolean"""
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
 def get_neighbours(cell, h, w):
     """Get neighboring cells"""
     x = cell[0]
@@ -288,6 +846,13 @@ def reward_map(corners, food, walls, ghosts, capsules):
     m = initial_map(corners, walls)
     h = corners[1][0] + 1
     w = corners[2][1] + 1
+    # Trap geometry is analysed once per layout
+    hazards = get_hazard_map(walls, h, w).grid
+    # Set lookups keep this linear in the board size on large layouts
+    food = set(food)
+    walls = set(walls)
+    ghosts = set(ghosts)
+    capsules = set(capsules)
 
     for i in range(w):
         for j in range(h):
@@ -300,10 +865,8 @@ def reward_map(corners, food, walls, ghosts, capsules):
                 m[i][j] = GHOST_REWARD
             elif cell in capsules:
                 m[i][j] = CAPSULE_REWARD
-            elif cell in [(7, 6), (10, 6)]:  # Special dangerous spots
-                m[i][j] = -100
             else:
-                m[i][j] = EMPTY_LOCATION_REWARD
+                m[i][j] = EMPTY_LOCATION_REWARD - HAZARD_PENALTY * hazards[i][j]
     return m
 
 
@@ -311,6 +874,7 @@ def initial_map(corners, walls):
     """Initialize the map with basic values"""
     h = corners[1][0] + 1
     w = corners[2][1] + 1
+    walls = set(walls)
     pacman_map = []
     for i in range(w):
         pacman_map.append([])
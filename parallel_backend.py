@@ -0,0 +1,162 @@
+# parallel_backend.py - Value iteration sweeps split across worker processes
+#
+# For very large layouts a single process sweeping every cell is bound to
+# one core. ParallelBackend keeps the ArrayBackend layout (flat buffers,
+# precomputed neighbour offsets, a WALL_VALUE sentinel slot) but allocates
+# the two value buffers and the rewards in shared memory, and splits the
+# open cells into tiles of whole rows, one per worker process. Workers are
+# started once and kept for the life of the backend; each sweep sends them
+# the index of the source buffer over a pipe and waits for all of them.
+#
+# A tile's halo (the rows just above and below it) belongs to the
+# neighbouring tiles and is read straight from the shared source buffer,
+# which holds the previous sweep of every tile. Waiting for every worker
+# before the next sweep is therefore the whole halo exchange, and no grid
+# data is ever copied between processes. Every cell is updated with the
+# same arithmetic as ArrayBackend.sweep, so the values are identical.
+#
+# Only full sweeps are split: partial sweeps (local and graph planning),
+# grids with fewer than MIN_TILE_CELLS open cells per worker, the reward map
+# and the move choice all run in the agent's process. The values have been
+# checked against ArrayBackend, but any latency gain has not been measured;
+# it was developed on a single-CPU host, where the workers only take turns
+# and no speed-up is possible.
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+from array_backend import ArrayBackend, WALL_VALUE, sweep_cells
+from layout_analysis import layout_key
+
+# Worker processes per backend, 0 starts one per CPU
+PARALLEL_WORKERS = 0
+# Grids with fewer open cells per worker than this are swept in-process
+MIN_TILE_CELLS = 2000
+
+_backend_cache = {}
+
+
+class TileOffsets(object):
+    """The neighbour offsets a worker needs, without the rest of the backend"""
+
+    def __init__(self, backend):
+        self.cells = backend.cells
+        self.east = backend.east
+        self.west = backend.west
+        self.north = backend.north
+        self.south = backend.south
+
+
+def tile_worker(conn, offsets, buffers, rewards, start, stop):
+    """Sweep one tile whenever asked to, until told to stop with None"""
+    positions = list(range(start, stop))
+    cells = offsets.cells
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        op, source, gamma = message
+        src = buffers[source]
+        dst = buffers[1 - source]
+        if op == 'sweep':
+            sweep_cells(offsets, src, dst, rewards, gamma, positions)
+            conn.send(None)
+        else:
+            # Largest change of the last sweep, which wrote into src
+            change = 0.0
+            for k in positions:
+                c = cells[k]
+                change = max(change, abs(src[c] - dst[c]))
+            conn.send(change)
+    conn.close()
+
+
+class ParallelBackend(ArrayBackend):
+    """ArrayBackend whose full sweeps run tile by tile in worker processes"""
+
+    def __init__(self, walls, h, w, workers=None):
+        ArrayBackend.__init__(self, walls, h, w)
+        if not workers:
+            workers = PARALLEL_WORKERS or multiprocessing.cpu_count()
+        workers = max(1, min(workers, len(self.cells) // MIN_TILE_CELLS))
+
+        self.buffers = [RawArray('d', self.size + 1), RawArray('d', self.size + 1)]
+        for buffer in self.buffers:
+            buffer[self.size] = WALL_VALUE
+        self.current, self.spare = self.buffers
+        self.rewards = RawArray('d', len(self.cells))
+        self.tiles = self._tiles(workers)
+        self.connections = []
+        self.processes = []
+
+    def _tiles(self, workers):
+        """(start, stop) position ranges of roughly equal size, cut between rows"""
+        count = len(self.cells)
+        target = (count + workers - 1) // workers
+        tiles = []
+        start = 0
+        while start < count:
+            stop = min(count, start + target)
+            # Extend to the end of the row so tiles hold whole rows
+            while stop < count and self.cells[stop] // self.h == self.cells[stop - 1] // self.h:
+                stop += 1
+            tiles.append((start, stop))
+            start = stop
+        return tiles
+
+    def start(self):
+        """Start the worker processes, once"""
+        if self.processes:
+            return
+        offsets = TileOffsets(self)
+        for (start, stop) in self.tiles:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=tile_worker,
+                args=(child, offsets, self.buffers, self.rewards, start, stop))
+            process.daemon = True
+            process.start()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def _source(self):
+        return 0 if self.current is self.buffers[0] else 1
+
+    def sweep(self, gamma, positions=None):
+        """One Bellman sweep, split over the workers when it covers the whole map"""
+        if positions is not None or len(self.tiles) < 2:
+            ArrayBackend.sweep(self, gamma, positions)
+            return
+        self.start()
+        source = self._source()
+        for conn in self.connections:
+            conn.send(('sweep', source, float(gamma)))
+        for conn in self.connections:
+            conn.recv()
+        self.current, self.spare = self.spare, self.current
+
+    def max_change(self, positions=None):
+        if positions is not None or not self.processes:
+            return ArrayBackend.max_change(self, positions)
+        source = self._source()
+        for conn in self.connections:
+            conn.send(('change', source, None))
+        return max(conn.recv() for conn in self.connections)
+
+
+def get_parallel_backend(walls, h, w, workers=None):
+    """Parallel backend for a layout, with its workers kept between games"""
+    key = (layout_key(walls, h, w), workers)
+    backend = _backend_cache.get(key)
+    if backend is None:
+        backend = ParallelBackend(walls, h, w, workers)
+        _backend_cache[key] = backend
+    return backend
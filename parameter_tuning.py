@@ -6,18 +6,29 @@
 import os
 import sys
 import json
+import math
 import time
+import random
 import itertools
 import subprocess
 from datetime import datetime
-from benchmark import MDPBenchmark
+from benchmark import MDPBenchmark, normal_quantile
+
+# Lowest rank correlation with the full evaluation for a proxy to be trusted
+MIN_PROXY_CORRELATION = 0.6
+# Chance of trusting a proxy whose ranking is unrelated to the full one
+PROXY_SIGNIFICANCE = 0.05
+# Configurations tested at every fidelity to calibrate the proxies
+CALIBRATION_SIZE = 12
+# Candidates promoted from the proxy ranking to full fidelity
+PROMOTE_TOP = 15
 
 class ParameterTuner:
     """Automated parameter tuning for MDP Pacman agent"""
     
-    def __init__(self, pacman_directory=".", backup_original=True):
+    def __init__(self, pacman_directory=".", backup_original=True, results_store=None):
         self.pacman_dir = pacman_directory
-        self.benchmark = MDPBenchmark(pacman_directory)
+        self.benchmark = MDPBenchmark(pacman_directory, results_store)
         self.original_file = None
         
         # Current best known parameters (your working configuration)
@@ -29,7 +40,8 @@ class ParameterTuner:
             'GAMMA': 0.9,
             'DANGER_ZONE_RATIO': 6,
             'DANGER': 500,
-            'ITERATIONS': 10
+            'ITERATIONS': 10,
+            'HAZARD_PENALTY': 0.0
         }
         
         # Parameter search spaces for optimization
@@ -41,7 +53,18 @@ class ParameterTuner:
             'GAMMA': [0.85, 0.9, 0.92, 0.95],
             'DANGER_ZONE_RATIO': [4, 5, 6, 7, 8],
             'ITERATIONS': [8, 10, 12, 15],
-            'EMPTY_LOCATION_REWARD': [-0.02, -0.04, -0.06, -0.08]
+            'EMPTY_LOCATION_REWARD': [-0.02, -0.04, -0.06, -0.08],
+            'HAZARD_PENALTY': [0.0, 0.5, 1.0, 2.0]
+        }
+        
+        # Evaluation settings for multi-fidelity tuning. 'full' is the real
+        # target; the proxies play fewer games, a smaller layout or fewer
+        # value iteration sweeps (ITERATIONS capped at 'iterations').
+        self.fidelities = {
+            'full': {'layout': 'mediumClassic', 'games': 25},
+            'few_games': {'layout': 'mediumClassic', 'games': 8},
+            'shallow': {'layout': 'mediumClassic', 'games': 8, 'iterations': 4},
+            'small_layout': {'layout': 'smallClassic', 'games': 8}
         }
         
         self.results_history = []
@@ -111,7 +134,8 @@ class ParameterTuner:
         
         try:
             # Run benchmark
-            result = self.benchmark.run_single_test(test_layout, test_games, quiet=True)
+            result = self.benchmark.run_single_test(test_layout, test_games, quiet=True,
+                                                    parameters=params)
             
             if result.get('success', False):
                 result['parameters'] = params.copy()
@@ -134,6 +158,70 @@ class ParameterTuner:
             # Always restore original parameters after test
             self._restore_original_file()
     
+    def test_configurations_distributed(self, configurations, queue_dir,
+                                        test_layout='mediumClassic', test_games=25,
+                                        timeout=None, max_wait=None):
+        """Test many configurations at once on distributed workers
+
+        Each configuration becomes one job on the queue in queue_dir. Workers
+        pass the parameters to the agent with -a, so mdpAgents.py is never
+        modified and any number of workers can share one checkout.
+        """
+        from distributed import JobQueue, JOB_TIMEOUT, WAIT_TIMEOUT
+        
+        timeout = timeout or JOB_TIMEOUT
+        queue = JobQueue(queue_dir)
+        job_ids = [queue.submit('tuning', {'parameters': params,
+                                           'layout': test_layout,
+                                           'num_games': test_games}, timeout)
+                   for params in configurations]
+        print("Queued %d configurations in %s" % (len(job_ids), queue_dir))
+        
+        results = []
+        for result in queue.wait(job_ids, timeout, max_wait=max_wait or WAIT_TIMEOUT):
+            if result.get('success', False):
+                if self.benchmark.results_store is not None:
+                    self.benchmark.results_store.record_result(result, 'tuning')
+                result['config_hash'] = hash(str(sorted(result['parameters'].items())))
+                print("  %s: %.1f%% win rate, %.1f avg score" % 
+                      (result['parameters'], result['win_rate'], result['average_score']))
+                self.results_history.append(result)
+                results.append(result)
+            else:
+                print("  Test failed: %s" % result.get('error', 'Unknown error'))
+                results.append(None)
+        return results
+    
+    def prescreen_configurations(self, configurations, states_file, drop_identical=False,
+                                 max_extra_contacts=0):
+        """Filter configurations on recorded states before playing any games
+
+        Every configuration is planned on the turns recorded in states_file
+        (see the agent's -a record option). Configurations that walk into
+        avoidable ghost contact more than max_extra_contacts times more often
+        than the baseline are dropped. drop_identical=True also drops those
+        choosing exactly the baseline's moves on every recorded turn; they
+        can still play differently in states the corpus does not contain,
+        so this only makes sense with a large corpus. Each turn is planned
+        from a fresh map (see counterfactual), not from the previous move's
+        map as in a game. Returns the remaining configurations.
+        """
+        from counterfactual import evaluate_file, print_reports
+
+        reports = evaluate_file(states_file, configurations, self.baseline_params)
+        print_reports(reports)
+
+        baseline_contacts = reports[0]['avoidable_contacts']
+        kept = []
+        for params, report in zip(configurations, reports[1:]):
+            if report['avoidable_contacts'] > baseline_contacts + max_extra_contacts:
+                continue
+            if drop_identical and report['identical']:
+                continue
+            kept.append(params)
+        print("Prescreen kept %d of %d configurations" % (len(kept), len(configurations)))
+        return kept
+
     def grid_search_optimization(self, max_combinations=50, test_games=25):
         """Perform grid search optimization across parameter space"""
         print("="*60)
@@ -314,6 +402,168 @@ class ParameterTuner:
         
         return best_result
     
+    def evaluate_at_fidelity(self, params, fidelity='full'):
+        """Test a configuration at one of self.fidelities, reusing earlier results"""
+        for result in self.results_history:
+            if result.get('fidelity') == fidelity and result.get('candidate') == params:
+                return result
+        
+        level = self.fidelities[fidelity]
+        test_params = params.copy()
+        if level.get('iterations') is not None:
+            test_params['ITERATIONS'] = min(test_params.get('ITERATIONS', level['iterations']),
+                                            level['iterations'])
+        
+        print("[%s fidelity]" % fidelity)
+        result = self.test_parameter_configuration(test_params, level['layout'], level['games'])
+        if result:
+            result['fidelity'] = fidelity
+            result['candidate'] = params.copy()
+        return result
+    
+    def proxy_correlations(self):
+        """Rank correlation of each proxy fidelity with the full evaluation
+        
+        Learned from every configuration in the history that was tested
+        both at the proxy and at full fidelity. Returns {fidelity: (rho or
+        None, pairs, mean seconds per evaluation)}.
+        """
+        scores = {}
+        times = {}
+        for result in self.results_history:
+            fidelity = result.get('fidelity')
+            if fidelity is None:
+                continue
+            key = json.dumps(result['candidate'], sort_keys=True)
+            scores.setdefault(fidelity, {})[key] = fidelity_score(result)
+            times.setdefault(fidelity, []).append(result.get('execution_time', 0.0))
+        
+        full = scores.get('full', {})
+        correlations = {}
+        for fidelity in self.fidelities:
+            if fidelity == 'full' or fidelity not in scores:
+                continue
+            shared = [key for key in scores[fidelity] if key in full]
+            rho = rank_correlation([scores[fidelity][k] for k in shared],
+                                   [full[k] for k in shared])
+            correlations[fidelity] = (rho, len(shared),
+                                      sum(times[fidelity]) / len(times[fidelity]))
+        return correlations
+    
+    def multi_fidelity_games(self, candidates, promote_top=PROMOTE_TOP,
+                             calibration_size=CALIBRATION_SIZE):
+        """Games multi_fidelity_tuning plays for a number of candidates, at most"""
+        full = self.fidelities['full']['games']
+        proxies = [level['games'] for name, level in self.fidelities.items() if name != 'full']
+        calibration = calibration_size * (full + sum(proxies))
+        return calibration + candidates * max(proxies) + (promote_top + 1) * full
+    
+    def multi_fidelity_tuning(self, candidates=None, promote_top=PROMOTE_TOP,
+                              calibration_size=CALIBRATION_SIZE,
+                              min_correlation=MIN_PROXY_CORRELATION):
+        """Rank candidates with a cheap proxy and play only the best at full fidelity
+        
+        A calibration set (the baseline and a fixed random sample) is tested
+        at every fidelity to learn how well each proxy ranks configurations
+        like the full evaluation. The cheapest proxy whose rank correlation
+        reaches both min_correlation and significance (see
+        significant_correlation) ranks all candidates, and the top promote_top
+        are validated at full fidelity. If no proxy qualifies the one with the
+        highest correlation is used anyway, so the cost stays bounded. When
+        there are too few candidates for calibration to pay off they are all
+        tested at full fidelity. Candidates default to every single-parameter
+        change of the baseline.
+        """
+        print("="*60)
+        print("MULTI-FIDELITY PARAMETER TUNING")
+        print("="*60)
+        
+        if candidates is None:
+            candidates = []
+            for param_name in sorted(self.search_spaces):
+                for value in self.search_spaces[param_name]:
+                    if value != self.baseline_params.get(param_name):
+                        candidates.append(dict(self.baseline_params, **{param_name: value}))
+        candidates = [c for c in candidates if c != self.baseline_params]
+        print("%d candidates, %d fidelity levels" % (len(candidates), len(self.fidelities)))
+        
+        full_games = self.fidelities['full']['games']
+        if self.multi_fidelity_games(len(candidates), promote_top, calibration_size) >= \
+                (len(candidates) + 1) * full_games:
+            print("Too few candidates for proxy screening to pay off, using full fidelity")
+            calibration_size = 0
+            promote_top = len(candidates)
+        
+        # Calibrate the proxies against the full evaluation
+        rng = random.Random(0)
+        calibration = []
+        if calibration_size > 0:
+            calibration = [self.baseline_params.copy()]
+            calibration += rng.sample(candidates, min(calibration_size - 1, len(candidates)))
+        for params in calibration:
+            for fidelity in self.fidelities:
+                self.evaluate_at_fidelity(params, fidelity)
+        
+        correlations = self.proxy_correlations()
+        print("\n--- Proxy Calibration ---")
+        for fidelity in sorted(correlations):
+            rho, pairs, seconds = correlations[fidelity]
+            print("  %-14s rho=%s over %d configurations, %.1fs per test" %
+                  (fidelity, "%.2f" % rho if rho is not None else "n/a", pairs, seconds))
+        
+        trusted = [(seconds, fidelity) for fidelity, (rho, pairs, seconds) in correlations.items()
+                   if rho is not None and rho >= min_correlation and
+                   significant_correlation(rho, pairs, len(correlations))]
+        measured = [(rho, fidelity) for fidelity, (rho, pairs, seconds) in correlations.items()
+                    if rho is not None]
+        if not calibration:
+            proxy = 'full'
+        elif trusted:
+            proxy = min(trusted)[1]
+            print("Using proxy: %s" % proxy)
+        elif measured:
+            proxy = max(measured)[1]
+            print("No proxy is significantly correlated with the full evaluation, "
+                  "using the best one: %s" % proxy)
+        else:
+            proxy = min((level['games'], name) for name, level in self.fidelities.items()
+                        if name != 'full')[1]
+            print("Proxy correlations are undefined, using the cheapest proxy: %s" % proxy)
+        
+        # Rank everything with the proxy, promote the best to full fidelity
+        ranked = []
+        for params in candidates:
+            result = self.evaluate_at_fidelity(params, proxy)
+            if result:
+                ranked.append((fidelity_score(result), params))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        
+        finalists = [params for (score, params) in ranked[:promote_top]]
+        print("\nPromoting %d of %d candidates to full fidelity" % (len(finalists), len(ranked)))
+        
+        best_result = self.evaluate_at_fidelity(self.baseline_params.copy(), 'full')
+        for params in finalists:
+            result = self.evaluate_at_fidelity(params, 'full')
+            if result and (best_result is None or
+                           fidelity_score(result) > fidelity_score(best_result)):
+                best_result = result
+        
+        # Cost compared with testing every candidate at full fidelity
+        spent = sum(r.get('execution_time', 0.0) for r in self.results_history
+                    if r.get('fidelity') is not None)
+        full_seconds = [r.get('execution_time', 0.0) for r in self.results_history
+                        if r.get('fidelity') == 'full']
+        if full_seconds:
+            full_only = (len(candidates) + 1) * sum(full_seconds) / len(full_seconds)
+            print("\nTime spent: %.0fs (full fidelity for every candidate: ~%.0fs)" %
+                  (spent, full_only))
+        if best_result:
+            print("Best at full fidelity: %.1f%% win rate, %.1f avg score" %
+                  (best_result['win_rate'], best_result['average_score']))
+            print("  Parameters: %s" % best_result['candidate'])
+        
+        return best_result
+    
     def _analyze_grid_search_results(self, baseline, best, improvement_count):
         """Analyze grid search results"""
         print("\n" + "="*60)
@@ -405,6 +655,7 @@ class ParameterTuner:
             'baseline_parameters': self.baseline_params,
             'search_spaces': self.search_spaces,
             'results_history': self.results_history,
+            'proxy_correlations': self.proxy_correlations(),
             'timestamp': datetime.now().isoformat()
         }
         
@@ -416,12 +667,14 @@ class ParameterTuner:
     
     def recommend_best_parameters(self):
         """Recommend best parameters based on all tests"""
-        if not self.results_history:
+        # Cheap proxy evaluations are not comparable with full runs
+        full_results = [r for r in self.results_history if r.get('fidelity', 'full') == 'full']
+        if not full_results:
             print("No tuning results available for recommendations.")
             return None
         
         # Find best performing configuration
-        best_result = max(self.results_history, key=lambda x: x.get('win_rate', 0))
+        best_result = max(full_results, key=lambda x: x.get('win_rate', 0))
         
         print("="*60)
         print("PARAMETER RECOMMENDATIONS")
@@ -445,6 +698,49 @@ class ParameterTuner:
         return best_result['parameters']
 
 
+def fidelity_score(result):
+    """Win rate with the average score as a tie-breaker"""
+    return result['win_rate'] + 0.001 * result['average_score']
+
+def significant_correlation(rho, pairs, proxies=1, alpha=PROXY_SIGNIFICANCE):
+    """Whether a rank correlation over pairs configurations is unlikely by chance
+
+    One-sided test with the normal approximation of Spearman's rho under
+    independence (variance 1 / (pairs - 1)), Bonferroni-corrected over the
+    proxies calibrated together.
+    """
+    if rho is None or pairs < 3:
+        return False
+    return rho * math.sqrt(pairs - 1) >= normal_quantile(1.0 - alpha / proxies)
+
+def rank_correlation(xs, ys):
+    """Spearman rank correlation with average ranks for ties, None if undefined"""
+    if len(xs) < 3:
+        return None
+    
+    def ranks(values):
+        order = sorted(range(len(values)), key=lambda i: values[i])
+        result = [0.0] * len(values)
+        start = 0
+        while start < len(order):
+            end = start
+            while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+                end += 1
+            for k in range(start, end + 1):
+                result[order[k]] = (start + end) / 2.0
+            start = end + 1
+        return result
+    
+    rx = ranks(xs)
+    ry = ranks(ys)
+    mean = (len(xs) - 1) / 2.0
+    covariance = sum((a - mean) * (b - mean) for a, b in zip(rx, ry))
+    spread_x = sum((a - mean) ** 2 for a in rx)
+    spread_y = sum((b - mean) ** 2 for b in ry)
+    if spread_x == 0 or spread_y == 0:
+        return None
+    return covariance / math.sqrt(spread_x * spread_y)
+
 # Convenience functions for quick optimization
 def quick_optimize(max_tests=20):
     """Quick parameter optimization"""
@@ -456,19 +752,43 @@ def sensitivity_check():
     tuner = ParameterTuner()
     return tuner.quick_sensitivity_analysis(test_games=10)
 
-def comprehensive_tuning():
-    """Comprehensive parameter tuning"""
+def multi_fidelity_optimize():
+    """Single-parameter changes ranked on proxies, the best validated in full"""
+    tuner = ParameterTuner()
+    return tuner.multi_fidelity_tuning()
+
+def comprehensive_tuning(max_combinations=None):
+    """Comprehensive parameter tuning
+
+    Every combination of the focus parameters (500 with the default search
+    spaces) is ranked on a cheap proxy. max_combinations limits this to a
+    seeded random sample, leaving the rest of the focused space untested.
+    """
     tuner = ParameterTuner()
     
+    # Combinations of the most promising parameters
+    focus_params = ['FOOD_REWARD', 'GHOST_REWARD', 'DANGER', 'GAMMA']
+    combinations = []
+    for values in itertools.product(*[tuner.search_spaces[p] for p in focus_params]):
+        combinations.append(dict(tuner.baseline_params, **dict(zip(focus_params, values))))
+    if max_combinations is not None and max_combinations < len(combinations):
+        print("Sampling %d of %d focused combinations" % (max_combinations, len(combinations)))
+        combinations = random.Random(1).sample(combinations, max_combinations)
+    
+    single_changes = sum(len(values) for values in tuner.search_spaces.values())
+    screening = tuner.multi_fidelity_games(single_changes) + \
+        tuner.multi_fidelity_games(len(combinations))
     print("Starting comprehensive parameter tuning...")
-    print("This may take 30-60 minutes depending on your system.")
+    print("Screening plays up to %d games (%d if every candidate were played in full),"
+          % (screening, (single_changes + len(combinations)) * tuner.fidelities['full']['games']))
+    print("then smart optimization plays 25 games per parameter change it tries.")
     
-    # Start with sensitivity analysis
-    tuner.quick_sensitivity_analysis(test_games=10)
+    # Explore single-parameter changes on cheap proxies, validating the
+    # best of them on full games
+    tuner.multi_fidelity_tuning()
     
-    # Focus on most promising parameters
-    focus_params = ['FOOD_REWARD', 'GHOST_REWARD', 'DANGER', 'GAMMA']
-    tuner.focused_tuning(focus_params, test_games=20)
+    # The focused combinations, screened the same way
+    tuner.multi_fidelity_tuning(combinations)
     
     # Final optimization
     best_result = tuner.smart_optimization(test_games=25)
@@ -488,6 +808,7 @@ if __name__ == "__main__":
     print("Available functions:")
     print("  - quick_optimize() - Fast optimization (~15 mins)")
     print("  - sensitivity_check() - Parameter sensitivity analysis (~10 mins)")
+    print("  - multi_fidelity_optimize() - Proxy screening, full runs for the best (~20 mins)")
     print("  - comprehensive_tuning() - Full optimization (~60 mins)")
     print()
     print("Example usage:")
@@ -503,6 +824,9 @@ if __name__ == "__main__":
         elif sys.argv[1] == '--sensitivity':
             print("\nRunning sensitivity analysis...")
             result = sensitivity_check()
+        elif sys.argv[1] == '--multi-fidelity':
+            print("\nRunning multi-fidelity tuning...")
+            result = multi_fidelity_optimize()
         elif sys.argv[1] == '--comprehensive':
             print("\nRunning comprehensive tuning...")
             result = comprehensive_tuning()
@@ -0,0 +1,388 @@
+# planner_comparison.py - Differential equivalence and speed checks for planners
+#
+# Runs the reference planner (list-of-lists value iteration, exactly as the
+# tuned agent plays) and an alternative planner side by side on the same
+# states, and reports per state how far the value maps deviate, whether
+# the chosen move differs and how much faster the alternative is. States
+# come from recorded snapshots (JSON lines of mdpAgents.snapshot_state
+# dicts) or are generated from a layout file by scattering Pacman, the
+# ghosts and the remaining food with a fixed seed, so every run compares
+# the same positions.
+#
+# compare_warm_start checks the cross-game warm start the same way: it plays
+# the opening moves of a layout with randomly moving ghosts and plans each
+# move both cold (ITERATIONS sweeps carried over from initial_map) and
+# warm (WARM_START_SWEEPS sweeps carried over from the converged opening
+# map), counting the moves on which the two agree.
+#
+# Usage:
+#   python2 planner_comparison.py layouts/mediumClassic.lay array local policy
+#   python2 planner_comparison.py layouts/mediumClassic.lay warm_start
+#   >>> report = compare_planners(generate_states(read_layout(path), 50), 'array')
+#   >>> report['passed'], report['disagreement_rate'], report['speedup_mean']
+
+import sys
+import json
+import time
+import random
+
+import mdpAgents
+from mdpAgents import (build_reward_map, choose_action, initial_map, plan_values,
+                       restore_snapshot)
+from pacman import Directions
+from layout_analysis import layout_key
+from array_backend import ArrayBackend
+from parallel_backend import get_parallel_backend
+from policy_iteration import PolicySolver
+
+# Highest share of states whose move may differ before a comparison fails
+DISAGREEMENT_TOLERANCE = 0.0
+# Timed runs of each planner per state, the fastest one counts
+TIMING_REPEATS = 3
+
+MOVES = {Directions.NORTH: (0, 1), Directions.SOUTH: (0, -1),
+         Directions.EAST: (1, 0), Directions.WEST: (-1, 0)}
+
+_backend_cache = {}
+
+
+class _Silenced:
+    """Swallows the planners' progress output while they are timed"""
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def read_layout(path):
+    """Snapshot of a Pacman .lay file: % walls, . food, o capsules, G ghosts, P Pacman"""
+    with open(path, 'r') as f:
+        return parse_layout(f.read())
+
+
+def parse_layout(text):
+    rows = [row for row in text.splitlines() if row.strip()][::-1]
+    height = len(rows)
+    width = max(len(row) for row in rows)
+    snap = {'walls': [], 'food': [], 'capsules': [], 'ghosts': [], 'pacman': None}
+    for y, row in enumerate(rows):
+        for x, char in enumerate(row.ljust(width, '%')):
+            if char == '%':
+                snap['walls'].append((x, y))
+            elif char == '.':
+                snap['food'].append((x, y))
+            elif char == 'o':
+                snap['capsules'].append((x, y))
+            elif char == 'G':
+                snap['ghosts'].append((x, y))
+            elif char == 'P':
+                snap['pacman'] = (x, y)
+    snap['corners'] = [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)]
+    return snap
+
+
+def generate_states(layout, count, seed=0):
+    """count states of a layout with Pacman, ghosts and food scattered at random"""
+    rng = random.Random(seed)
+    walls = set(layout['walls'])
+    corners = layout['corners']
+    open_cells = sorted((x, y) for x in range(corners[1][0] + 1)
+                        for y in range(corners[2][1] + 1) if (x, y) not in walls)
+    food = sorted(layout['food'])
+    states = []
+    for n in range(count):
+        pacman = rng.choice(open_cells)
+        ghosts = [rng.choice(open_cells) for g in layout['ghosts']]
+        eaten = rng.random()
+        states.append({
+            'corners': list(corners),
+            'walls': list(layout['walls']),
+            'food': [f for f in food if f != pacman and rng.random() > eaten],
+            'capsules': [c for c in layout['capsules'] if rng.random() < 0.5],
+            'ghosts': ghosts,
+            'pacman': pacman
+        })
+    return states
+
+
+def load_states(path):
+    """Recorded snapshots, one JSON object per line"""
+    states = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                states.append(restore_snapshot(json.loads(line)))
+    return states
+
+
+def legal_moves(snap):
+    """Moves from Pacman's position that do not run into a wall"""
+    x, y = snap['pacman']
+    walls = set(snap['walls'])
+    moves = [(Directions.NORTH, (x, y + 1)), (Directions.SOUTH, (x, y - 1)),
+             (Directions.EAST, (x + 1, y)), (Directions.WEST, (x - 1, y))]
+    return [move for (move, cell) in moves if cell not in walls]
+
+
+def reference_planner(snap):
+    """ITERATIONS sweeps of list-of-lists value iteration from a fresh map"""
+    return plan_values(initial_map(snap['corners'], snap['walls']), snap)
+
+
+def array_planner(snap):
+    h = snap['corners'][1][0] + 1
+    w = snap['corners'][2][1] + 1
+    key = layout_key(snap['walls'], h, w)
+    backend = _backend_cache.get(key)
+    if backend is None:
+        backend = _backend_cache[key] = ArrayBackend(snap['walls'], h, w)
+    return plan_values(initial_map(snap['corners'], snap['walls']), snap, backend=backend)
+
+
+def parallel_planner(snap):
+    h = snap['corners'][1][0] + 1
+    w = snap['corners'][2][1] + 1
+    backend = get_parallel_backend(snap['walls'], h, w)
+    return plan_values(initial_map(snap['corners'], snap['walls']), snap, backend=backend)
+
+
+def local_planner(snap):
+    return plan_values(initial_map(snap['corners'], snap['walls']), snap, local=True)
+
+
+def graph_planner(snap):
+    return plan_values(initial_map(snap['corners'], snap['walls']), snap, graph=True)
+
+
+def policy_planner(snap):
+    h = snap['corners'][1][0] + 1
+    w = snap['corners'][2][1] + 1
+    solver = PolicySolver(snap['walls'], h, w)
+    return solver.solve(build_reward_map(snap), mdpAgents.GAMMA)
+
+
+PLANNERS = {
+    'reference': reference_planner,
+    'array': array_planner,
+    'parallel': parallel_planner,
+    'local': local_planner,
+    'graph': graph_planner,
+    'policy': policy_planner
+}
+
+
+def time_planner(planner, snap, repeats=TIMING_REPEATS):
+    """Value map of the last run and the fastest of repeats runs"""
+    best = None
+    m = None
+    stdout = sys.stdout
+    sys.stdout = _Silenced()
+    try:
+        for run in range(repeats):
+            start = time.time()
+            m = planner(snap)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        sys.stdout = stdout
+    return m, best
+
+
+def map_deviation(m1, m2, cells):
+    """Largest absolute difference over cells, infinite if only one is a wall"""
+    deviation = 0.0
+    for (i, j) in cells:
+        a = m1[i][j]
+        b = m2[i][j]
+        if a is None and b is None:
+            continue
+        if a is None or b is None:
+            return float('inf')
+        deviation = max(deviation, abs(a - b))
+    return deviation
+
+
+def compare_state(snap, reference, alternative, repeats=TIMING_REPEATS):
+    """Deviation, move agreement and timings of two planners on one state"""
+    h = snap['corners'][1][0] + 1
+    w = snap['corners'][2][1] + 1
+    ref_map, ref_time = time_planner(reference, snap, repeats)
+    alt_map, alt_time = time_planner(alternative, snap, repeats)
+
+    x, y = snap['pacman']
+    all_cells = [(i, j) for i in range(w) for j in range(h)]
+    neighbours = [(i, j) for (i, j) in [(y + 1, x), (y - 1, x), (y, x + 1), (y, x - 1)]
+                  if 0 <= i < w and 0 <= j < h]
+    legal = legal_moves(snap)
+    ref_action = choose_action(ref_map, snap['pacman'], legal)[0]
+    alt_action = choose_action(alt_map, snap['pacman'], legal)[0]
+    return {
+        'pacman': snap['pacman'],
+        'max_deviation': map_deviation(ref_map, alt_map, all_cells),
+        'neighbour_deviation': map_deviation(ref_map, alt_map, neighbours),
+        'reference_action': ref_action,
+        'alternative_action': alt_action,
+        'agrees': ref_action == alt_action,
+        'reference_time': ref_time,
+        'alternative_time': alt_time,
+        'speedup': ref_time / alt_time if alt_time > 0 else None
+    }
+
+
+def compare_planners(states, alternative, reference='reference',
+                     tolerance=DISAGREEMENT_TOLERANCE, max_deviation=None,
+                     repeats=TIMING_REPEATS):
+    """Run two planners on every state and check they choose the same moves.
+
+    Planners are names from PLANNERS or callables taking a snapshot and
+    returning a value map. The comparison fails when the share of states
+    with a different move exceeds tolerance, or, if max_deviation is given,
+    when any value next to Pacman deviates by more than that.
+    """
+    name = alternative if not callable(alternative) else getattr(alternative, '__name__', 'custom')
+    if not callable(reference):
+        reference = PLANNERS[reference]
+    if not callable(alternative):
+        alternative = PLANNERS[alternative]
+
+    results = [compare_state(snap, reference, alternative, repeats) for snap in states]
+    disagreements = sum(1 for r in results if not r['agrees'])
+    speedups = [r['speedup'] for r in results if r['speedup'] is not None]
+    rate = float(disagreements) / len(results) if results else 0.0
+    worst = max([r['neighbour_deviation'] for r in results] or [0.0])
+
+    passed = rate <= tolerance
+    if max_deviation is not None and worst > max_deviation:
+        passed = False
+
+    return {
+        'planner': name,
+        'states': len(results),
+        'disagreements': disagreements,
+        'disagreement_rate': rate,
+        'max_deviation': max([r['max_deviation'] for r in results] or [0.0]),
+        'neighbour_deviation': worst,
+        'speedup_mean': sum(speedups) / len(speedups) if speedups else None,
+        'speedup_min': min(speedups) if speedups else None,
+        'passed': passed,
+        'results': results
+    }
+
+
+def compare_warm_start(layout, games=50, moves=None, seed=0):
+    """Move agreement of warm-started and cold planning over opening moves.
+
+    layout is a read_layout() snapshot. Each game starts from the layout's
+    opening position; Pacman follows the cold planner's moves, eats the food
+    it walks over, and the ghosts move at random, seeded per game. Also
+    reported is how often each planner picks the move of a fully converged
+    map, and the mean planning time per move of both.
+    """
+    if moves is None:
+        moves = mdpAgents.OPENING_MOVES
+    walls = set(layout['walls'])
+    opening = dict(layout, food=list(layout['food']), capsules=list(layout['capsules']),
+                   ghosts=list(layout['ghosts']))
+    converge = lambda snap: plan_values(initial_map(snap['corners'], snap['walls']), snap,
+                                        iterations=mdpAgents.CONVERGENCE_SWEEP_LIMIT,
+                                        tolerance=mdpAgents.CONVERGENCE_TOLERANCE)
+    opening_map = time_planner(converge, opening, 1)[0]
+    warm_sweeps = min(mdpAgents.WARM_START_SWEEPS, mdpAgents.ITERATIONS)
+
+    total = agreements = warm_converged = cold_converged = 0
+    warm_time = cold_time = 0.0
+    for game in range(games):
+        rng = random.Random(seed + game)
+        snap = dict(opening)
+        cold = initial_map(snap['corners'], snap['walls'])
+        warm = [row[:] for row in opening_map]
+        for move in range(moves):
+            legal = legal_moves(snap)
+            cold, elapsed = time_planner(lambda s: plan_values(cold, s), snap, 1)
+            cold_time += elapsed
+            warm, elapsed = time_planner(
+                lambda s: plan_values(warm, s, iterations=warm_sweeps), snap, 1)
+            warm_time += elapsed
+            best = choose_action(time_planner(converge, snap, 1)[0], snap['pacman'], legal)[0]
+            cold_action = choose_action(cold, snap['pacman'], legal)[0]
+            warm_action = choose_action(warm, snap['pacman'], legal)[0]
+            total += 1
+            agreements += cold_action == warm_action
+            cold_converged += cold_action == best
+            warm_converged += warm_action == best
+
+            pacman = step(snap['pacman'], cold_action)
+            ghosts = []
+            for ghost in snap['ghosts']:
+                cells = [step(ghost, m) for m in MOVES if step(ghost, m) not in walls]
+                ghosts.append(rng.choice(cells) if cells else ghost)
+            snap = dict(snap, pacman=pacman, ghosts=ghosts,
+                        food=[f for f in snap['food'] if f != pacman],
+                        capsules=[c for c in snap['capsules'] if c != pacman])
+
+    return {
+        'games': games,
+        'moves': total,
+        'agreements': agreements,
+        'agreement_rate': float(agreements) / total if total else 1.0,
+        'warm_matches_converged': warm_converged,
+        'cold_matches_converged': cold_converged,
+        'warm_time': warm_time / total if total else 0.0,
+        'cold_time': cold_time / total if total else 0.0
+    }
+
+
+def step(cell, move):
+    """Cell reached by a move, ignoring walls"""
+    dx, dy = MOVES[move]
+    return (cell[0] + dx, cell[1] + dy)
+
+
+def print_warm_start_report(report):
+    print("warm_start %4d opening moves  agree with cold %5.1f%%  match converged: "
+          "warm %d, cold %d  %.4fs vs %.4fs per move" %
+          (report['moves'], 100.0 * report['agreement_rate'],
+           report['warm_matches_converged'], report['cold_matches_converged'],
+           report['warm_time'], report['cold_time']))
+
+
+def print_report(report):
+    print("%-10s %4d states  moves differ %5.1f%%  max deviation %.3g "
+          "(next to Pacman %.3g)  speed-up %.2fx mean, %.2fx min  %s" %
+          (report['planner'], report['states'], 100.0 * report['disagreement_rate'],
+           report['max_deviation'], report['neighbour_deviation'],
+           report['speedup_mean'] or 0.0, report['speedup_min'] or 0.0,
+           "PASS" if report['passed'] else "FAIL"))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python2 planner_comparison.py <layout.lay|states.jsonl> [planner ...]")
+        print("Planners: %s" % ', '.join(sorted(p for p in PLANNERS if p != 'reference')))
+        sys.exit(2)
+
+    source = sys.argv[1]
+    if source.endswith('.jsonl'):
+        states = load_states(source)
+    else:
+        states = generate_states(read_layout(source), 50)
+    planners = sys.argv[2:] or ['array']
+
+    failed = False
+    for planner in planners:
+        if planner == 'warm_start':
+            if source.endswith('.jsonl'):
+                print("warm_start needs a layout file, not recorded states")
+                failed = True
+                continue
+            warm_report = compare_warm_start(read_layout(source))
+            print_warm_start_report(warm_report)
+            failed = failed or warm_report['agreement_rate'] < 1.0 - DISAGREEMENT_TOLERANCE
+            continue
+        report = compare_planners(states, planner)
+        print_report(report)
+        failed = failed or not report['passed']
+    sys.exit(1 if failed else 0)
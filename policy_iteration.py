@@ -0,0 +1,166 @@
+# policy_iteration.py - Policy iteration over a layout's sparse transitions
+#
+# The movement model of mdpAgents.bellmann (80% intended move, 10% to each
+# side, walls and the board edge worth WALL_VALUE) depends only on the
+# layout, so its sparse transition structure is built once per layout and
+# cached. A PolicySolver then alternates Gauss-Seidel evaluation of the
+# current policy with greedy improvement until the policy no longer
+# changes. Each evaluation sweep only follows one action per cell, and the
+# solver keeps its policy and values between moves, so later moves usually
+# need one or two improvement steps. At discount factors of 0.9 and above
+# this reaches the converged values in far less time than value iteration.
+#
+# Values are stored as flat lists over the open cells, with one extra slot
+# holding WALL_VALUE; solve() returns a list-of-lists map like
+# mdpAgents.value_iteration.
+
+import time
+
+from layout_analysis import layout_key
+from array_backend import WALL_VALUE
+
+# Stop evaluating a policy once no value changes by more than this
+POLICY_TOLERANCE = 1e-4
+# Improvement steps before giving up on a stable policy
+POLICY_ITERATION_LIMIT = 100
+# Gauss-Seidel sweeps allowed per policy evaluation
+EVALUATION_SWEEP_LIMIT = 1000
+
+_transition_cache = {}
+
+
+class LayoutTransitions(object):
+    """Sparse transitions of the agent's movement model on one layout.
+
+    rows[k][a] lists the (target, probability) pairs of taking action a in
+    open cell k, with target == size for a wall or the edge of the board.
+    Actions are ordered north, south, east, west as in bellmann.
+    """
+
+    def __init__(self, walls, h, w):
+        self.h = h
+        self.w = w
+        walls = set(walls)
+        self.cells = [(i, j) for i in range(w) for j in range(h)
+                      if (j, i) not in walls]
+        self.index = dict((c, k) for k, c in enumerate(self.cells))
+        self.size = len(self.cells)
+
+        def target(i, j):
+            return self.index.get((i, j), self.size)
+
+        self.rows = []
+        for (i, j) in self.cells:
+            east = target(i + 1, j)
+            west = target(i - 1, j)
+            north = target(i, j + 1)
+            south = target(i, j - 1)
+            self.rows.append([
+                [(north, 0.8), (east, 0.1), (west, 0.1)],
+                [(south, 0.8), (east, 0.1), (west, 0.1)],
+                [(east, 0.8), (north, 0.1), (south, 0.1)],
+                [(west, 0.8), (north, 0.1), (south, 0.1)]
+            ])
+
+
+def get_layout_transitions(walls, h, w):
+    """Transition structure for a layout, built once and cached"""
+    key = layout_key(walls, h, w)
+    transitions = _transition_cache.get(key)
+    if transitions is None:
+        transitions = LayoutTransitions(walls, h, w)
+        _transition_cache[key] = transitions
+    return transitions
+
+
+class PolicySolver(object):
+    """Policy iteration for one game, warm-started from its previous move"""
+
+    def __init__(self, walls, h, w):
+        self.transitions = get_layout_transitions(walls, h, w)
+        self.policy = [0] * self.transitions.size
+        self.values = None
+
+    def solve(self, r_map, gamma, deadline=None, stats=None,
+              tolerance=POLICY_TOLERANCE):
+        """Optimal values of a reward map, as a list-of-lists map.
+
+        With a deadline (absolute time.time() value) the solver stops
+        between evaluation sweeps once it is reached and returns the values
+        of the current policy. If stats is a dict it receives the number of
+        improvement steps, evaluation sweeps, the time taken and whether
+        the policy converged or the deadline was hit. One evaluation sweep
+        always runs, so an expired deadline still plans on this turn's
+        rewards; stats['overrun'] records that case.
+        """
+        start = time.time()
+        transitions = self.transitions
+        size = transitions.size
+        rows = transitions.rows
+        gamma = float(gamma)
+        rewards = [float(r_map[i][j]) for (i, j) in transitions.cells]
+        if self.values is None:
+            self.values = rewards + [WALL_VALUE]
+        values = self.values
+        policy = self.policy
+
+        iterations = 0
+        sweeps = 0
+        converged = False
+        budget_hit = False
+        overrun = False
+        while iterations < POLICY_ITERATION_LIMIT and not budget_hit:
+            iterations += 1
+
+            # Policy evaluation, in place
+            for sweep in range(EVALUATION_SWEEP_LIMIT):
+                if deadline is not None and time.time() > deadline:
+                    budget_hit = True
+                    if sweeps > 0:
+                        break
+                    overrun = True
+                sweeps += 1
+                change = 0.0
+                for k in range(size):
+                    (t1, p1), (t2, p2), (t3, p3) = rows[k][policy[k]]
+                    value = rewards[k] + gamma * (p1 * values[t1] + p2 * values[t2] +
+                                                  p3 * values[t3])
+                    change = max(change, abs(value - values[k]))
+                    values[k] = value
+                if change < tolerance:
+                    break
+
+            # Greedy improvement, keeping the current action on ties
+            stable = True
+            for k in range(size):
+                actions = rows[k]
+                best = policy[k]
+                best_value = sum(p * values[t] for (t, p) in actions[best])
+                for a in range(len(actions)):
+                    value = sum(p * values[t] for (t, p) in actions[a])
+                    if value > best_value + 1e-12:
+                        best = a
+                        best_value = value
+                if best != policy[k]:
+                    policy[k] = best
+                    stable = False
+            if stable and not budget_hit:
+                converged = True
+                break
+
+        if stats is not None:
+            stats['iterations'] = iterations
+            stats['sweeps'] = sweeps
+            stats['time'] = time.time() - start
+            stats['converged'] = converged
+            stats['budget_hit'] = budget_hit
+            stats['overrun'] = overrun
+        return self.to_map()
+
+    def to_map(self):
+        """The solver's values as a list-of-lists map, walls as None"""
+        transitions = self.transitions
+        m = [[None] * transitions.h for i in range(transitions.w)]
+        for k, (i, j) in enumerate(transitions.cells):
+            m[i][j] = self.values[k]
+        return m
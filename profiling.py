@@ -0,0 +1,104 @@
+# profiling.py - Summaries of cProfile data captured from the agent
+#
+# The agent writes raw pstats files when run with -a profile=<file> (only
+# its getAction path is profiled). These helpers merge the raw files of a
+# layout, write the merged pstats and a collapsed-stack file that flame
+# graph tools (flamegraph.pl, speedscope) read directly, and list the
+# hottest functions for the benchmark results.
+
+import os
+import pstats
+
+# Function the collapsed stacks are rooted at
+ROOT_FUNCTION = 'getAction'
+# Deepest stack written to the collapsed-stack file
+MAX_STACK_DEPTH = 64
+
+
+def function_label(func):
+    """Readable name for a pstats function key (file, line, name)"""
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return '%s:%d(%s)' % (os.path.basename(filename), line, name)
+
+
+def top_functions(stats, top_n=15):
+    """The top_n functions by own time, as plain dicts"""
+    rows = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            'function': function_label(func),
+            'calls': nc,
+            'tottime': tt,
+            'cumtime': ct
+        })
+    rows.sort(key=lambda row: row['tottime'], reverse=True)
+    return rows[:top_n]
+
+
+def collapsed_stacks(stats, root_name=ROOT_FUNCTION):
+    """Flame graph stacks rebuilt from the profile's caller graph
+
+    cProfile only records caller/callee pairs, so time below a function is
+    split between its callers in proportion to each call edge's cumulative
+    time. Returns a dict mapping 'a;b;c' stacks to microseconds.
+    """
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            # edge is (cc, nc, tt, ct) for this caller -> func pair
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+
+    def walk(func, path, budget):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        if ct <= 0 or budget <= 0:
+            return
+        scale = budget / ct
+        key = ';'.join(path)
+        own = tt * scale
+        if own > 0:
+            stacks[key] = stacks.get(key, 0) + int(own * 1e6)
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_ct in callees.get(func, []):
+            label = function_label(child)
+            if label in path:
+                continue
+            walk(child, path + [label], edge_ct * scale)
+
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if func[2] == root_name:
+            walk(func, [function_label(func)], ct)
+    return stacks
+
+
+def summarize_profiles(raw_files, output_prefix, top_n=15):
+    """Merge raw pstats files and write <prefix>.pstats and <prefix>.collapsed"""
+    raw_files = [f for f in raw_files if os.path.exists(f)]
+    if not raw_files:
+        return None
+
+    stats = pstats.Stats(raw_files[0])
+    for filename in raw_files[1:]:
+        stats.add(filename)
+
+    pstats_file = output_prefix + '.pstats'
+    stats.dump_stats(pstats_file)
+
+    collapsed_file = output_prefix + '.collapsed'
+    stacks = collapsed_stacks(stats)
+    with open(collapsed_file, 'w') as f:
+        for stack in sorted(stacks):
+            if stacks[stack] > 0:
+                f.write('%s %d\n' % (stack, stacks[stack]))
+
+    return {
+        'runs': len(raw_files),
+        'pstats_file': pstats_file,
+        'collapsed_file': collapsed_file,
+        'total_time': stats.total_tt,
+        'top_functions': top_functions(stats, top_n)
+    }
@@ -0,0 +1,231 @@
+# results_store.py - Queryable history of benchmark and tuning results
+#
+# An append-only SQLite database (standard library sqlite3) that replaces
+# merging timestamped JSON files for trend analysis. Runs and their games
+# are written as they happen, each in its own transaction, so a crashed run
+# leaves every finished game on disk and the run marked as unfinished.
+# One store can be shared by several threads (e.g. MDPBenchmark.run_load_test);
+# its connection is used under a lock.
+#
+# Usage:
+#   >>> store = ResultsStore('results.db')
+#   >>> benchmark = MDPBenchmark(results_store=store)
+#   >>> store.best_configurations('mediumClassic')
+
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    agent_class TEXT,
+    num_games INTEGER,
+    parameters TEXT,
+    config_hash TEXT,
+    seed TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    wins INTEGER,
+    win_rate REAL,
+    average_score REAL,
+    execution_time REAL,
+    decision_mean REAL,
+    decision_max REAL,
+    success INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    game_index INTEGER,
+    layout TEXT NOT NULL,
+    config_hash TEXT,
+    seed TEXT,
+    score INTEGER,
+    win INTEGER,
+    moves INTEGER,
+    decision_mean REAL,
+    decision_max REAL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_layout_time ON runs (layout, started);
+CREATE INDEX IF NOT EXISTS runs_by_config ON runs (config_hash, layout);
+CREATE INDEX IF NOT EXISTS games_by_run ON games (run_id);
+CREATE INDEX IF NOT EXISTS games_by_layout ON games (layout, created);
+"""
+
+
+def config_hash(parameters):
+    """Stable hash of a parameter set, the same in every process
+
+    Only the upper-case tunable module parameters (-a GAMMA=0.95) identify a
+    configuration; run options such as profile=<path> or memory=1 do not.
+    Numbers are compared as floats, so '0.95' from -a matches 0.95.
+    """
+    tunable = {}
+    for name, value in (parameters or {}).items():
+        if name.isupper():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                pass
+            tunable[name] = value
+    if not tunable:
+        return None
+    encoded = json.dumps(tunable, sort_keys=True).encode('utf-8')
+    return hashlib.md5(encoded).hexdigest()[:16]
+
+
+class ResultsStore:
+    """Append-only SQLite store for benchmark and tuning results"""
+
+    def __init__(self, path='results.db'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # Write-ahead logging keeps committed records safe if a run crashes
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def start_run(self, kind, layout, num_games, agent_class='MDPAgent',
+                  parameters=None, seed=None):
+        """Record the start of a run and return its id"""
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (kind, layout, agent_class, num_games, parameters, '
+                'config_hash, seed, started) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (kind, layout, agent_class, num_games,
+                 json.dumps(parameters, sort_keys=True) if parameters else None,
+                 config_hash(parameters), seed, time.time()))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def add_game(self, run_id, game):
+        """Record one finished game of a run"""
+        with self.lock:
+            run = self.conn.execute('SELECT layout, config_hash, seed FROM runs WHERE id = ?',
+                                    (run_id,)).fetchone()
+            self.conn.execute(
+                'INSERT INTO games (run_id, game_index, layout, config_hash, seed, score, win, '
+                'moves, decision_mean, decision_max, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, game.get('index'), run['layout'], run['config_hash'],
+                 game.get('seed', run['seed']), game['score'], int(bool(game['win'])),
+                 game.get('moves'), game.get('decision_mean'), game.get('decision_max'),
+                 time.time()))
+            self.conn.commit()
+
+    def finish_run(self, run_id, result):
+        """Record the summary of a finished (or failed) run"""
+        games = result.get('games') or []
+        times = [g['decision_mean'] for g in games if g.get('decision_mean') is not None]
+        maxima = [g['decision_max'] for g in games if g.get('decision_max') is not None]
+        with self.lock:
+            self.conn.execute(
+                'UPDATE runs SET finished = ?, wins = ?, win_rate = ?, average_score = ?, '
+                'execution_time = ?, decision_mean = ?, decision_max = ?, success = ?, '
+                'error = ? WHERE id = ?',
+                (time.time(), result.get('wins'), result.get('win_rate'),
+                 result.get('average_score'), result.get('execution_time'),
+                 sum(times) / len(times) if times else None,
+                 max(maxima) if maxima else None,
+                 int(bool(result.get('success', False))), result.get('error'), run_id))
+            self.conn.commit()
+
+    def record_result(self, result, kind='benchmark', parameters=None, agent_class='MDPAgent'):
+        """Record a complete result dict from run_single_test in one go"""
+        run_id = self.start_run(kind, result['layout'], result.get('num_games'), agent_class,
+                                parameters or result.get('parameters'), result.get('seed'))
+        for game in result.get('games') or []:
+            self.add_game(run_id, game)
+        self.finish_run(run_id, result)
+        return run_id
+
+    def import_json(self, filename):
+        """Load a benchmark or tuning JSON file written by save_results"""
+        with open(filename, 'r') as f:
+            data = json.load(f)
+
+        if isinstance(data, dict):
+            records = [(r, 'tuning') for r in data.get('results_history', [])]
+        else:
+            records = [(r, 'benchmark') for r in data]
+
+        run_ids = []
+        for result, kind in records:
+            if 'layout' in result:
+                run_ids.append(self.record_result(result, kind))
+        return run_ids
+
+    def best_configurations(self, layout=None, limit=5, min_games=1):
+        """Parameter sets with the highest win rate over all their tuning games"""
+        query = ('SELECT config_hash, parameters, layout, SUM(num_games) AS games, '
+                 'SUM(wins) AS wins, 100.0 * SUM(wins) / SUM(num_games) AS win_rate, '
+                 'SUM(average_score * num_games) / SUM(num_games) AS average_score, '
+                 'COUNT(*) AS runs '
+                 'FROM runs WHERE success = 1 AND config_hash IS NOT NULL ')
+        args = []
+        if layout is not None:
+            query += 'AND layout = ? '
+            args.append(layout)
+        query += ('GROUP BY config_hash, layout HAVING SUM(num_games) >= ? '
+                  'ORDER BY win_rate DESC, average_score DESC LIMIT ?')
+        args.extend([min_games, limit])
+
+        with self.lock:
+            rows = [dict(row) for row in self.conn.execute(query, args)]
+        for row in rows:
+            row['parameters'] = json.loads(row['parameters']) if row['parameters'] else None
+        return rows
+
+    def trend(self, layout, kind=None, since=None, config=None):
+        """Win rate, score and decision time of finished runs over time"""
+        query = ('SELECT id, kind, started, num_games, win_rate, average_score, '
+                 'decision_mean, decision_max, config_hash FROM runs '
+                 'WHERE layout = ? AND success = 1 ')
+        args = [layout]
+        if kind is not None:
+            query += 'AND kind = ? '
+            args.append(kind)
+        if since is not None:
+            query += 'AND started >= ? '
+            args.append(since)
+        if config is not None:
+            query += 'AND config_hash = ? '
+            args.append(config_hash(config) if isinstance(config, dict) else config)
+        query += 'ORDER BY started'
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, args)]
+
+    def compare_layouts(self, config=None, since=None):
+        """Per-layout totals over all recorded games"""
+        query = ('SELECT layout, COUNT(*) AS games, SUM(win) AS wins, '
+                 '100.0 * SUM(win) / COUNT(*) AS win_rate, AVG(score) AS average_score, '
+                 'AVG(decision_mean) AS decision_mean, MAX(decision_max) AS decision_max '
+                 'FROM games WHERE 1 = 1 ')
+        args = []
+        if config is not None:
+            query += 'AND config_hash = ? '
+            args.append(config_hash(config) if isinstance(config, dict) else config)
+        if since is not None:
+            query += 'AND created >= ? '
+            args.append(since)
+        query += 'GROUP BY layout ORDER BY layout'
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, args)]
+
+    def unfinished_runs(self):
+        """Runs that started but never recorded a summary, e.g. after a crash"""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                'SELECT * FROM runs WHERE finished IS NULL ORDER BY started')]
@@ -0,0 +1,65 @@
+# test_sequential_analysis.py - False-stop rate of the sequential win-rate test
+#
+# Run from the repository root with: python -m unittest discover tests
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import benchmark
+
+
+class SimulatedBenchmark(benchmark.MDPBenchmark):
+    """Benchmark whose games are coin flips with a fixed win probability"""
+
+    def __init__(self, win_probability, seed):
+        benchmark.MDPBenchmark.__init__(self)
+        self.win_probability = win_probability
+        self.rng = random.Random(seed)
+
+    def run_single_test(self, layout, num_games, *args, **kwargs):
+        games = [{'index': k, 'win': self.rng.random() < self.win_probability,
+                  'score': 0} for k in range(num_games)]
+        return {'success': True, 'games': games}
+
+
+class SequentialAnalysisTest(unittest.TestCase):
+
+    RUNS = 2000
+
+    def stop_reasons(self, win_probability, threshold):
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            reasons = []
+            for run in range(self.RUNS):
+                suite = SimulatedBenchmark(win_probability, run)
+                summary = suite.run_sequential_analysis(
+                    'simulated', max_games=200, batch_size=10, threshold=threshold)
+                reasons.append(summary['stopped_reason'])
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return reasons
+
+    def test_false_stop_rate_at_threshold(self):
+        # An agent exactly at the threshold must rarely be called decisive
+        reasons = self.stop_reasons(0.6, 60.0)
+        rate = float(reasons.count('decisive')) / len(reasons)
+        self.assertLessEqual(rate, 0.05)
+
+    def test_clear_difference_still_stops_early(self):
+        reasons = self.stop_reasons(0.9, 60.0)
+        rate = float(reasons.count('decisive')) / len(reasons)
+        self.assertGreaterEqual(rate, 0.95)
+
+    def test_normal_quantile(self):
+        self.assertAlmostEqual(benchmark.normal_quantile(0.975), 1.959964, 5)
+        self.assertAlmostEqual(benchmark.sequential_z(10, 10), 1.959964, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,185 @@
 # Simple visualization module - no complex dependencies
+#
+# Optionally renders the value map of every move as a heatmap frame (binary
+# PPM images or ANSI colour text). The agent only copies the map into a
+# bounded queue; a background thread draws and writes the frames, and when
+# it falls behind new frames are dropped instead of delaying the game.
+
+import os
+import math
+import time
+import threading
+from array import array
+from array_backend import ValueMap
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+# Frames waiting to be written before new ones are dropped
+HEATMAP_QUEUE_SIZE = 16
+# Pixels per map cell in PPM frames
+HEATMAP_CELL_PIXELS = 8
+# Seconds final() waits for queued frames to be written
+HEATMAP_DRAIN_TIMEOUT = 5.0
+
+WALL_COLOUR = (40, 40, 40)
+PACMAN_COLOUR = (255, 220, 0)
+GHOST_COLOUR = (255, 255, 255)
+
+
+def copy_values(agent_map):
+    """Snapshot of a value map that later moves cannot change.
+
+    List maps are copied row by row; array backend views are copied as one
+    flat buffer, which is much cheaper than converting them to lists.
+    """
+    backend = getattr(agent_map, 'backend', None)
+    if backend is not None:
+        return ValueMap(backend, array('d', backend.current))
+    return [row[:] for row in agent_map]
+
+
+def value_colour(value, scale):
+    """Red for negative, green for positive values, on a log scale"""
+    if scale <= 0:
+        return (0, 0, 0)
+    level = math.log1p(abs(value)) / scale
+    shade = int(40 + 215 * min(1.0, level))
+    if value < 0:
+        return (shade, 0, 0)
+    return (0, shade, 0)
+
+
+def heatmap_cells(frame):
+    """Colour of every cell of a frame, as rows from the top of the board"""
+    values = frame['values']
+    w = len(values)
+    h = len(values[0])
+    magnitudes = [abs(values[i][j]) for i in range(w) for j in range(h)
+                  if values[i][j] is not None]
+    scale = math.log1p(max(magnitudes)) if magnitudes else 0.0
+    pacman = frame['pacman']
+    ghosts = set((int(round(x)), int(round(y))) for (x, y) in frame['ghosts'])
+
+    rows = []
+    for i in reversed(range(w)):
+        row = []
+        for j in range(h):
+            if (j, i) == tuple(pacman):
+                row.append(PACMAN_COLOUR)
+            elif (j, i) in ghosts:
+                row.append(GHOST_COLOUR)
+            elif values[i][j] is None:
+                row.append(WALL_COLOUR)
+            else:
+                row.append(value_colour(values[i][j], scale))
+        rows.append(row)
+    return rows
+
+
+def write_ppm(path, rows, cell_pixels=HEATMAP_CELL_PIXELS):
+    data = bytearray()
+    for row in rows:
+        line = bytearray()
+        for colour in row:
+            line.extend(bytearray(colour) * cell_pixels)
+        data.extend(line * cell_pixels)
+    with open(path, 'wb') as f:
+        f.write(('P6\n%d %d\n255\n' % (len(rows[0]) * cell_pixels,
+                                         len(rows) * cell_pixels)).encode('ascii'))
+        f.write(data)
+
+
+def write_ansi(path, rows, caption):
+    lines = [caption]
+    for row in rows:
+        lines.append(''.join('\x1b[48;2;%d;%d;%dm  ' % colour for colour in row) + '\x1b[0m')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class HeatmapRenderer:
+    """Writes queued value-map frames from a background thread"""
+
+    def __init__(self, output_dir, frame_format='ppm', queue_size=HEATMAP_QUEUE_SIZE):
+        if frame_format not in ('ppm', 'ansi'):
+            raise ValueError("Unknown heatmap format: %s" % frame_format)
+        self.output_dir = output_dir
+        self.frame_format = frame_format
+        self.queue = queue.Queue(queue_size)
+        self.written = 0
+        self.dropped = 0
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, frame):
+        """Queue a frame, dropping it if the renderer is behind"""
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+
+    def drain(self, timeout=HEATMAP_DRAIN_TIMEOUT):
+        """Wait (up to timeout seconds) for the queued frames to be written"""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            try:
+                self._render(frame)
+                self.written += 1
+            except Exception as e:
+                print("Heatmap frame failed: %s" % e)
+            finally:
+                self.queue.task_done()
+
+    def _render(self, frame):
+        name = 'game%03d_move%04d' % (frame['game'], frame['move'])
+        rows = heatmap_cells(frame)
+        scores = ' '.join('%s=%.2f' % (a, frame['scores'][a]) for a in sorted(frame['scores']))
+        caption = '%s chose %s  %s' % (name, frame['choice'], scores)
+        if self.frame_format == 'ppm':
+            write_ppm(os.path.join(self.output_dir, name + '.ppm'), rows)
+            with open(os.path.join(self.output_dir, 'frames.txt'), 'a') as f:
+                f.write(caption + '\n')
+        else:
+            write_ansi(os.path.join(self.output_dir, name + '.ans'), rows, caption)
+
 
 class GameVisualizer:
-    def __init__(self, enable_logging=True):
+    def __init__(self, enable_logging=True, heatmap_dir=None, heatmap_format='ppm'):
         self.enable_logging = enable_logging
         self.game_count = 0
         self.decisions_made = 0
+        self.renderer = None
+        if heatmap_dir:
+            self.renderer = HeatmapRenderer(heatmap_dir, heatmap_format)
         
-    def visualize_game_state(self, state, agent_map, pacman_pos):
-        """Simple game state visualization"""
+    def visualize_game_state(self, state, agent_map, pacman_pos, sweeps=None,
+                             action_scores=None, choice=None, ghosts=None):
+        """Simple game state visualization, plus a heatmap frame if enabled"""
         print("Map Legend: P=Pacman, G=Ghost, F=Food, C=Capsule, #=Wall")
         print("Current Pacman position: %s" % str(pacman_pos))
-        print("Map analysis: Value function computed for %d iterations" % 8)
+        if sweeps is not None:
+            print("Map analysis: Value function computed for %d iterations" % sweeps)
+        if self.renderer is not None:
+            self.renderer.submit({
+                'game': self.game_count + 1,
+                'move': self.decisions_made + 1,
+                'values': copy_values(agent_map),
+                'pacman': pacman_pos,
+                'ghosts': list(ghosts or []),
+                'scores': dict(action_scores or {}),
+                'choice': choice
+            })
         
     def log_decision(self, state, action_scores, chosen_action, decision_time):
         """Log decision information"""
@@ -25,14 +194,27 @@ class GameVisualizer:
             confidence = best_score - worst_score
             print("  Decision confidence: %.2f (higher = more decisive)" % confidence)
             
-    def log_game_result(self, state, game_won, final_score):
+    def log_game_result(self, state, game_won, final_score, memory=None):
         """Log game completion"""
         self.game_count += 1
         print("\n--- Game %d Summary ---" % self.game_count)
         print("Result: %s" % ("WIN" if game_won else "LOSS"))
         print("Total decisions made: %d" % self.decisions_made)
+        if memory and 'max_rss' in memory:
+            print("Memory: peak RSS %.1f KiB, grew %.1f KiB this game" %
+                  (memory['max_rss'] / 1024.0, memory['game_rss_growth'] / 1024.0))
+        elif memory:
+            print("Memory per move: peak %.1f KiB max, %.1f KiB mean, net %+.1f KiB mean" %
+                  (memory['move_peak_max'] / 1024.0, memory['move_peak_mean'] / 1024.0,
+                   memory['move_net_mean'] / 1024.0))
+            print("Memory per game: peak %.1f KiB, net %+.1f KiB" %
+                  (memory['game_peak'] / 1024.0, memory['game_net'] / 1024.0))
+        if self.renderer is not None:
+            self.renderer.drain()
+            print("Heatmap frames: %d written, %d dropped" %
+                  (self.renderer.written, self.renderer.dropped))
         self.decisions_made = 0  # Reset for next game
 
-def create_visualizer(enable_logging=True):
+def create_visualizer(enable_logging=True, heatmap_dir=None, heatmap_format='ppm'):
     """Create visualizer instance"""
-    return GameVisualizer(enable_logging)
\ No newline at end of file
+    return GameVisualizer(enable_logging, heatmap_dir, heatmap_format)
\ No newline at end of file